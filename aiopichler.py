@@ -0,0 +1,169 @@
+"""
+Asyncio wrapper for accessing Pichler heat pump unit
+"""
+
+import asyncio
+import threading
+import concurrent.futures
+import pichler
+
+class AsyncPichler:
+	"""
+	Asyncio version of `pichler.Pichler`.
+
+	Blocking Nabto calls are executed on a bounded thread pool, so event loop is never blocked.
+	Calls that are still waiting in the pool can be cancelled, calls that already run
+	can't be interrupted (caller is released on cancellation/timeout, call finishes on background).
+
+	Use as async context manager:
+
+		async with AsyncPichler() as device:
+			print(await device.GetDatapoint('Temperature.Room'))
+
+	Methods
+	-------
+	Open()
+		Establish session to device
+
+	Close()
+		Wait for running calls and close session to device
+
+	GetDatapoint(dp), GetDatapoints(dps)
+		Get value(s) of datapoint(s)
+
+	GetSetpoint(sp), GetSetpoints(sps)
+		Get value(s) of setpoint(s)
+
+	SetSetpoint(sp, value), SetSetpoints(sps)
+		Set value(s) of setpoint(s)
+
+	Poll(names)
+		Get values of multiple datapoints and setpoints
+
+	Ping()
+		Ping device
+	"""
+
+	def __init__(self, device=None, user=None, passwd=None, max_workers=4, timeout=None, instance=None):
+		"""
+		Parameters
+		----------
+		device, user, passwd : str, optional
+			Passed to `pichler.Pichler` (see there)
+		max_workers : int, optional
+			Maximal number of concurrently running device calls, by default 4
+		timeout : float, optional
+			Default timeout (in seconds) of single call, by default None (no timeout)
+		instance : pichler.Pichler, optional
+			Already connected instance to use instead of creating a new one, by default None
+		"""
+		self._args = (device, user, passwd)
+		self.timeout = timeout
+		self.device = instance
+		self._executor = concurrent.futures.ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='pichler')
+		self._running = set()
+		self._closed = False
+
+	async def __aenter__(self):
+		await self.Open()
+		return self
+
+	async def __aexit__(self, *exc):
+		await self.Close()
+
+	async def Open(self, timeout=None):
+		"""Establish session to device (if no instance was given)"""
+		if self.device is None:
+			self.device = await self._Run(lambda: pichler.Pichler(*self._args), timeout)
+
+	async def Close(self, timeout=None):
+		"""Close session to device
+
+		Calls waiting in the pool are cancelled, running calls are awaited before session is closed.
+		If some calls are still running after timeout, session is closed on background when the last one finishes
+		(Nabto session can't be closed under running RPC).
+
+		Parameters
+		----------
+		timeout : float, optional
+			Maximal time to wait for running calls, by default None (wait indefinitely)
+		"""
+		if self._closed:
+			return
+		self._closed = True
+		self._executor.shutdown(wait=False, cancel_futures=True)
+		running = [f for f in list(self._running) if not f.done()]
+		if running:
+			await asyncio.wait([asyncio.wrap_future(f) for f in running], timeout=timeout)
+			running = [f for f in running if not f.done()]
+		if self.device is None:
+			return
+		if running:
+			self._CloseWhenDone(running)
+			return
+		await asyncio.get_running_loop().run_in_executor(None, self.device.Close)
+
+	def _CloseWhenDone(self, futures):
+		"""Close session after all given (pool) futures finish"""
+		left = [len(futures)]
+		lock = threading.Lock()
+
+		def Done(future):
+			with lock:
+				left[0] -= 1
+				if left[0]:
+					return
+			# runs on pool thread that finished the last call
+			self.device.Close()
+
+		for future in futures:
+			future.add_done_callback(Done)
+
+	async def _Run(self, func, timeout):
+		if self._closed:
+			raise RuntimeError('AsyncPichler is closed')
+		future = self._executor.submit(func)
+		self._running.add(future)
+		future.add_done_callback(self._running.discard)
+		if timeout is None:
+			timeout = self.timeout
+		# cancellation of awaited future cancels pool future too (if it didn't start yet)
+		return await asyncio.wait_for(asyncio.wrap_future(future), timeout)
+
+	async def _Call(self, method, *args, timeout=None):
+		if self.device is None:
+			raise RuntimeError('AsyncPichler is not opened')
+		func = getattr(self.device, method)
+		return await self._Run(lambda: func(*args), timeout)
+
+	async def GetDatapoint(self, dp, timeout=None):
+		"""Get value of single datapoint (see `pichler.Pichler.GetDatapoint`)"""
+		return await self._Call('GetDatapoint', dp, timeout=timeout)
+
+	async def GetDatapoints(self, dps, timeout=None):
+		"""Get values of multiple datapoints (see `pichler.Pichler.GetDatapoints`)"""
+		return await self._Call('GetDatapoints', dps, timeout=timeout)
+
+	async def GetSetpoint(self, sp, timeout=None):
+		"""Get value of single setpoint (see `pichler.Pichler.GetSetpoint`)"""
+		return await self._Call('GetSetpoint', sp, timeout=timeout)
+
+	async def GetSetpoints(self, sps, timeout=None):
+		"""Get values of multiple setpoints (see `pichler.Pichler.GetSetpoints`)"""
+		return await self._Call('GetSetpoints', sps, timeout=timeout)
+
+	async def SetSetpoint(self, sp, value, timeout=None):
+		"""Set value to single setpoint (see `pichler.Pichler.SetSetpoint`)"""
+		return await self._Call('SetSetpoint', sp, value, timeout=timeout)
+
+	async def SetSetpoints(self, sps, timeout=None):
+		"""Set values to multiple setpoints (see `pichler.Pichler.SetSetpoints`)"""
+		return await self._Call('SetSetpoints', sps, timeout=timeout)
+
+	async def Poll(self, names, timeout=None):
+		"""Get values of multiple datapoints and setpoints (see `pichler.Pichler.Poll`)"""
+		return await self._Call('Poll', names, timeout=timeout)
+
+	async def Ping(self, timeout=None):
+		"""Ping device and return its response (see `pichler.Pichler.Ping`)"""
+		return await self._Call('Ping', timeout=timeout)
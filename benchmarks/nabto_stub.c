@@ -0,0 +1,42 @@
+/*
+ * Minimal stand-in for Nabto client library used by micro-benchmarks.
+ * Every RPC returns the same canned response (25 datapoint values),
+ * or response set by nabtoStubSetResponse (not part of Nabto API).
+ */
+
+#include <stdlib.h>
+#include <string.h>
+
+static const char* canned =
+	"{\"response\": {\"data\": ["
+	"{\"value\": 1}, {\"value\": 2}, {\"value\": 3}, {\"value\": 4}, {\"value\": 5}, "
+	"{\"value\": 6}, {\"value\": 7}, {\"value\": 8}, {\"value\": 9}, {\"value\": 10}, "
+	"{\"value\": 11}, {\"value\": 12}, {\"value\": 13}, {\"value\": 14}, {\"value\": 15}, "
+	"{\"value\": 16}, {\"value\": 17}, {\"value\": 18}, {\"value\": 19}, {\"value\": 20}, "
+	"{\"value\": 21}, {\"value\": 22}, {\"value\": 23}, {\"value\": 24}, {\"value\": 25}"
+	"]}}";
+
+static const char* response = 0;
+
+void nabtoStubSetResponse(const char* r) { response = r; }
+
+int nabtoStartup(const char* home) { return 0; }
+int nabtoShutdown(void) { return 0; }
+int nabtoInstallDefaultStaticResources(const char* dir) { return 0; }
+int nabtoSetOption(const char* name, const char* value) { return 0; }
+int nabtoGetLocalDevices(char*** devices, int* count) { *devices = 0; *count = 0; return 0; }
+int nabtoCreateProfile(const char* user, const char* pwd) { return 0; }
+int nabtoOpenSession(void** session, const char* user, const char* pwd) { *session = (void*)1; return 0; }
+int nabtoCloseSession(void* session) { return 0; }
+int nabtoRpcSetDefaultInterface(void* session, const char* xml, char** err) { *err = 0; return 0; }
+
+int nabtoRpcInvoke(void* session, const char* url, char** out)
+{
+	const char* r = response ? response : canned;
+	size_t n = strlen(r) + 1;
+	*out = malloc(n);
+	memcpy(*out, r, n);
+	return 0;
+}
+
+int nabtoFree(void* p) { free(p); return 0; }
@@ -0,0 +1,85 @@
+"""
+Micro-benchmark of per-RPC overhead of Nabto binding
+
+Compares original untyped ctypes call path (bare `cdll` attributes, new output and `pointer` per call)
+with typed binding in `nabtoapi`. Library calls go to `nabto_stub.c` (compiled on the fly by `cc`),
+which returns canned response, so only Python/ctypes overhead is measured:
+  binding - minimal response, time of call, copy and free of response (what the binding itself costs)
+  rpc     - 25 values response, JSON parsing included (it's the same in both paths and dominates)
+
+Usage: python benchmarks/rpc_overhead.py [iterations per repeat]
+"""
+
+import os
+import sys
+import json
+import timeit
+import tempfile
+import subprocess
+import ctypes
+from ctypes import c_char_p, c_void_p, pointer
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+import nabtoapi
+
+URL = 'nabto://device.remote.lscontrol.dk/datapointReadListValue.json?json={"request": {"list": []}}'
+
+def BuildStub(directory):
+	source = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'nabto_stub.c')
+	library = os.path.join(directory, 'libnabto_stub.so')
+	subprocess.check_call([os.environ.get('CC', 'cc'), '-O2', '-shared', '-fPIC', '-o', library, source])
+	return library
+
+def Legacy(path):
+	"""Call path of the original `nabto.Client.Session.RpcInvoke`"""
+	client = ctypes.cdll.LoadLibrary(path)
+	session = c_void_p()
+	client.nabtoOpenSession(pointer(session), b'user', b'password')
+
+	def RpcInvoke(nabtoUrl):
+		out = c_char_p()
+		client.nabtoRpcInvoke(session, nabtoUrl.encode(), pointer(out))
+		if out:
+			response = out.value
+			client.nabtoFree(out)
+			return json.loads(response)
+		return []
+
+	return lambda: RpcInvoke(URL)
+
+def Typed(path):
+	"""Call path of typed binding (URL encoded once, as prepared reads do)"""
+	api = nabtoapi.Library(path)
+	session = api.OpenSession('user', 'password')
+	url = URL.encode()
+	return lambda: api.RpcInvoke(session, url)
+
+# responses of measured cases (None = canned response of the stub)
+CASES = [('binding', b'{"response": {}}'), ('rpc', None)]
+
+def Measure(calls, iterations, repeat=25):
+	"""Best time (us per call) of each call, repeats of calls are interleaved so drift affects all of them"""
+	best = {name: float('inf') for name, _ in calls}
+	for _ in range(repeat):
+		for name, call in calls:
+			best[name] = min(best[name], timeit.timeit(call, number=iterations) / iterations * 1e6)
+	return best
+
+def main():
+	iterations = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+	with tempfile.TemporaryDirectory() as directory:
+		path = BuildStub(directory)
+		calls = [('legacy', Legacy(path)), ('typed', Typed(path))]
+		stub = ctypes.CDLL(path)
+		stub.nabtoStubSetResponse.argtypes = [c_char_p]
+		stub.nabtoStubSetResponse.restype = None
+		print('%-8s %12s %12s %8s' % ('case', 'legacy us', 'typed us', 'speedup'))
+		for case, response in CASES:
+			# stub is loaded once by both paths, response is shared
+			stub.nabtoStubSetResponse(response)
+			assert calls[0][1]() == calls[1][1]()
+			r = Measure(calls, iterations)
+			print('%-8s %12.2f %12.2f %7.2fx' % (case, r['legacy'], r['typed'], r['legacy'] / r['typed']))
+
+if __name__ == '__main__':
+	main()
@@ -0,0 +1,160 @@
+"""
+Benchmark suite of poll cycles against fake Nabto library (see `fakenabto`)
+
+Reports RPC count, wall time and CPU time per iteration of each scenario:
+  collect   - one `collect.py` cycle with all items due (read + publish)
+  info      - one `info.py` run (new client and session, ping, snapshot)
+  snapshot  - `Pichler.Snapshot()` of all datapoints and setpoints
+  batch     - planned read of 500 addresses (`Pichler.RawReadPlanned`)
+  list      - single list read of 500 addresses (`Pichler.DatapointRawReadListValues`)
+
+Usage: python benchmarks/run.py [-n iterations] [--latency s] [--jitter s] [--sessions n] [--save file] [--baseline file]
+
+With `--baseline`, results are compared to previously saved ones and the script fails
+if any scenario needs more RPCs or is slower than allowed by `--tolerance`.
+"""
+
+import os
+import io
+import sys
+import json
+import time
+import runpy
+import argparse
+import contextlib
+from collections import Counter
+
+package_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, package_dir)
+
+os.environ['NABTO_BACKEND'] = 'fake'
+os.environ.setdefault('PICHLER_DEVICE_ID', 'fake')
+os.environ.setdefault('PICHLER_USER', 'user')
+os.environ.setdefault('PICHLER_PASSWORD', 'password')
+
+import nabto
+import fakenabto
+import pichler
+import publisher
+import collect
+
+def CreateDevice(library):
+	return pichler.Pichler(client=nabto.Client(os.path.join(package_dir, '.home'), library))
+
+def Collect(library):
+	device = CreateDevice(library)
+	collect.mqtt_publisher = publisher.Publisher(lambda topic, value, retain: None)
+	prepared = {}
+
+	def Run():
+		# new collector has all items due, prepared reads are kept as in long running process
+		c = collect.Collector(device, collect.MQTT_PREFIX)
+		c.prepared = prepared
+		c.Collect()
+
+	return Run, library.calls
+
+def Info(library):
+	calls = Counter()
+	script = os.path.join(package_dir, 'info.py')
+
+	def Run():
+		with contextlib.redirect_stdout(io.StringIO()):
+			g = runpy.run_path(script)
+		calls.update(g['device'].client.api.calls)
+
+	return Run, calls
+
+def Snapshot(library):
+	device = CreateDevice(library)
+	return device.Snapshot, library.calls
+
+def Batch(library):
+	device = CreateDevice(library)
+	# neighbouring addresses (ranges) mixed with scattered ones
+	lst = [[a, 1] for a in range(0, 200)] + [[a, 0] for a in range(0, 900, 3)]
+	return (lambda: device.RawReadPlanned('DP', lst)), library.calls
+
+def List(library):
+	device = CreateDevice(library)
+	lst = [[a, 1] for a in range(0, 200)] + [[a, 0] for a in range(0, 900, 3)]
+	return (lambda: device.DatapointRawReadListValues(lst)), library.calls
+
+SCENARIOS = {
+	'collect': Collect,
+	'info': Info,
+	'snapshot': Snapshot,
+	'batch': Batch,
+	'list': List,
+}
+
+def Measure(scenario, iterations, latency, jitter):
+	os.environ['NABTO_FAKE_LATENCY'] = str(latency)
+	os.environ['NABTO_FAKE_JITTER'] = str(jitter)
+	library = fakenabto.FakeLibrary(latency, jitter, seed=1)
+	run, calls = SCENARIOS[scenario](library)
+
+	# warm up (caches, prepared reads)
+	run()
+	before = sum(calls.values())
+
+	wall = time.perf_counter()
+	cpu = time.process_time()
+	for _ in range(iterations):
+		run()
+	wall = time.perf_counter() - wall
+	cpu = time.process_time() - cpu
+
+	return {
+		'rpcs': (sum(calls.values()) - before) / iterations,
+		'wall_ms': wall / iterations * 1000,
+		'cpu_ms': cpu / iterations * 1000,
+	}
+
+def Compare(results, baseline, tolerance):
+	"""Get list of regressions against baseline results"""
+	regressions = []
+	for scenario, r in results.items():
+		b = baseline.get(scenario)
+		if not b:
+			continue
+		if r['rpcs'] > b['rpcs']:
+			regressions.append('%s: %.1f RPCs (baseline %.1f)' % (scenario, r['rpcs'], b['rpcs']))
+		for key in ('wall_ms', 'cpu_ms'):
+			if r[key] > b[key] * (1 + tolerance):
+				regressions.append('%s: %s %.2f (baseline %.2f)' % (scenario, key, r[key], b[key]))
+	return regressions
+
+def main():
+	parser = argparse.ArgumentParser(description=__doc__.split('\n')[1])
+	parser.add_argument('scenarios', nargs='*', default=list(SCENARIOS), help='scenarios to run (all by default)')
+	parser.add_argument('-n', '--iterations', type=int, default=50, help='iterations per scenario')
+	parser.add_argument('--latency', type=float, default=0.0, help='simulated RPC latency (seconds)')
+	parser.add_argument('--jitter', type=float, default=0.0, help='simulated RPC jitter (seconds)')
+	parser.add_argument('--sessions', type=int, default=1, help='sessions used for concurrent reads (see PICHLER_SESSIONS)')
+	parser.add_argument('--save', help='save results to JSON file')
+	parser.add_argument('--baseline', help='compare results with JSON file saved by --save')
+	parser.add_argument('--tolerance', type=float, default=0.25, help='allowed slowdown against baseline (0.25 = 25%%)')
+	args = parser.parse_args()
+	os.environ['PICHLER_SESSIONS'] = str(args.sessions)
+
+	results = {}
+	print('%-10s %8s %10s %10s' % ('scenario', 'rpcs', 'wall ms', 'cpu ms'))
+	for scenario in args.scenarios:
+		r = results[scenario] = Measure(scenario, args.iterations, args.latency, args.jitter)
+		print('%-10s %8.1f %10.2f %10.2f' % (scenario, r['rpcs'], r['wall_ms'], r['cpu_ms']))
+
+	if args.save:
+		with open(args.save, 'w') as file:
+			json.dump(results, file, indent=4)
+
+	if args.baseline:
+		with open(args.baseline, 'r') as file:
+			regressions = Compare(results, json.load(file), args.tolerance)
+		for r in regressions:
+			print('REGRESSION ' + r)
+		if regressions:
+			sys.exit(1)
+
+if __name__ == '__main__':
+	main()
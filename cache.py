@@ -0,0 +1,201 @@
+"""
+Read-through cache for datapoint/setpoint values
+"""
+
+import time
+import fnmatch
+import threading
+import concurrent.futures
+from collections import OrderedDict
+
+# default time to live (in seconds) of cached values, first matching pattern wins
+DEFAULT_TTLS = [
+	('DP:Power.*', 5),
+	('DP:StatusBits', 5),
+	('DP:Energy.*', 300),
+	('SP:*', 300),
+]
+
+class ReadCache:
+	"""
+	Bounded read-through cache with per-item time to live.
+
+	Items are keyed by qualified names ('DP:name', 'SP:name').
+	Concurrent misses of the same item are merged into single fetch.
+	Least recently used items are evicted when cache is full.
+
+	Attributes
+	----------
+	hits : int
+		Number of items served from cache
+	misses : int
+		Number of items fetched from device
+	merged : int
+		Number of misses served by fetch started by another caller
+	evictions : int
+		Number of items evicted because cache was full
+
+	Methods
+	-------
+	Get(keys, fetch)
+		Get values of items, fetch missing/expired ones
+
+	GetTimed(keys, fetch)
+		Get values of items along with time the oldest of them was read
+
+	Invalidate(keys)
+		Drop cached values of items
+	"""
+
+	def __init__(self, ttls=DEFAULT_TTLS, default_ttl=30, max_size=256):
+		"""
+		Parameters
+		----------
+		ttls : list, optional
+			List of (pattern, ttl) pairs, pattern is matched against item key (see `fnmatch`), by default `DEFAULT_TTLS`
+		default_ttl : float, optional
+			Time to live of items that don't match any pattern, by default 30
+		max_size : int, optional
+			Maximal number of cached items, by default 256
+		"""
+		self.ttls = list(ttls)
+		self.default_ttl = default_ttl
+		self.max_size = max_size
+
+		self.hits = 0
+		self.misses = 0
+		self.merged = 0
+		self.evictions = 0
+
+		self._lock = threading.Lock()
+		# key -> (value, expiration, read time)
+		self._entries = OrderedDict()
+		# key -> future of running fetch
+		self._pending = {}
+		# key -> number of invalidations (fetch started before invalidation isn't stored)
+		self._generation = {}
+		self._ttl = {}
+
+	def TTL(self, key):
+		"""Get time to live of item"""
+		ttl = self._ttl.get(key)
+		if ttl is None:
+			ttl = next((t for p, t in self.ttls if fnmatch.fnmatchcase(key, p)), self.default_ttl)
+			self._ttl[key] = ttl
+		return ttl
+
+	def Get(self, keys, fetch):
+		"""Get values of items
+
+		Parameters
+		----------
+		keys : list
+			Item keys
+		fetch : callable
+			Function that reads items from device: fetch(keys) -> dict of values keyed by key
+
+		Returns
+		-------
+		list
+			Values of items (same order as input list)
+		"""
+		return self.GetTimed(keys, fetch)[0]
+
+	def GetTimed(self, keys, fetch):
+		"""Get values of items along with time they were read
+
+		Parameters
+		----------
+		keys : list
+			Item keys
+		fetch : callable
+			Function that reads items from device: fetch(keys) -> dict of values keyed by key
+
+		Returns
+		-------
+		tuple
+			(values, time) - values of items (same order as input list) and time (seconds since epoch)
+			the oldest of them was read (cached values can be up to their TTL old)
+		"""
+		now = time.monotonic()
+		values = {}
+		waiting = {}
+		missing = {}
+		with self._lock:
+			for key in dict.fromkeys(keys):
+				entry = self._entries.get(key)
+				if entry is not None and entry[1] > now:
+					self._entries.move_to_end(key)
+					values[key] = (entry[0], entry[2])
+					self.hits += 1
+				elif key in self._pending:
+					waiting[key] = self._pending[key]
+					self.merged += 1
+				else:
+					missing[key] = self._pending[key] = concurrent.futures.Future()
+					self.misses += 1
+			generations = {key: self._generation.get(key, 0) for key in missing}
+
+		if missing:
+			t = time.time()
+			try:
+				fetched = fetch(list(missing))
+			except Exception as e:
+				with self._lock:
+					for key, future in missing.items():
+						self._Done(key, future)
+						future.set_exception(e)
+				raise
+
+			now = time.monotonic()
+			with self._lock:
+				for key, future in missing.items():
+					self._Done(key, future)
+					if key not in fetched:
+						future.set_exception(KeyError(key))
+						continue
+					value = fetched[key]
+					if self._generation.get(key, 0) == generations[key]:
+						self._Store(key, value, now + self.TTL(key), t)
+					future.set_result((value, t))
+			values.update((key, (value, t)) for key, value in fetched.items())
+
+		for key, future in waiting.items():
+			values[key] = future.result()
+
+		result = [values[key] for key in keys]
+		return [value for value, t in result], min((t for value, t in result), default=time.time())
+
+	def Invalidate(self, keys):
+		"""Drop cached values of items (running fetches of these items won't be cached either)
+
+		Parameters
+		----------
+		keys : list
+			Item keys
+		"""
+		with self._lock:
+			for key in keys:
+				self._entries.pop(key, None)
+				self._pending.pop(key, None)
+				self._generation[key] = self._generation.get(key, 0) + 1
+
+	def Clear(self):
+		"""Drop all cached values"""
+		with self._lock:
+			for key in list(self._entries) + list(self._pending):
+				self._generation[key] = self._generation.get(key, 0) + 1
+			self._entries.clear()
+			self._pending.clear()
+
+	def _Done(self, key, future):
+		"""Unregister finished fetch (it may be already replaced by newer fetch after invalidation)"""
+		if self._pending.get(key) is future:
+			del self._pending[key]
+
+	def _Store(self, key, value, expiration, t):
+		self._entries[key] = (value, expiration, t)
+		self._entries.move_to_end(key)
+		while len(self._entries) > self.max_size:
+			self._entries.popitem(last=False)
+			self.evictions += 1
@@ -4,7 +4,19 @@ Periodically read selected data from heat pump unit
 
 import os
 import pichler
+import fleet
+import derived
+import history
+import metrics
+import payload
+import publisher
+import registers
+import scheduler
+import spool
+import worker
+import writequeue
 import time
+import threading
 import traceback
 import paho.mqtt.client as mqtt
 
@@ -18,145 +30,421 @@ def DebugLog(s):
 	if debug:
 		Log(s)
 
+# items are (topic, name[, options]) where options is dict with optional keys:
+#   deadband      - minimal change of value that is published when change-only publishing is enabled (0 by default)
+#   interval      - poll interval in seconds (`POLL_INTERVAL` by default)
+#   fast_interval - poll interval used while unit is in active state (see `fast_status_mask`)
 set_points = [
-	('setting/water/temperature', 'HotWater.Temperature'),
-	('setting/water/e-heating', 'HotWater.E.Heating'),
-	('setting/water/fast-heating', 'HotWater.Fast.Heating'),
-	('setting/ventilation/temperature/normal', 'Temperature.Normal'),
-	('setting/ventilation/temperature/cooling', 'Temperature.ActiveCooling'),
-	('setting/operating-mode', 'OperatingMode'),
+	('setting/water/temperature', 'HotWater.Temperature', {'interval': 300}),
+	('setting/water/e-heating', 'HotWater.E.Heating', {'interval': 300}),
+	('setting/water/fast-heating', 'HotWater.Fast.Heating', {'interval': 300}),
+	('setting/ventilation/temperature/normal', 'Temperature.Normal', {'interval': 300}),
+	('setting/ventilation/temperature/cooling', 'Temperature.ActiveCooling', {'interval': 300}),
+	('setting/operating-mode', 'OperatingMode', {'interval': 300}),
 ]
 
 # datapoints to read
 data_points = [
-	('energy', 'Energy.Total'),
-	('energy/cooling', 'Energy.Cooling'),
-	('energy/heating', 'Energy.Heating'),
-	('energy/water', 'Energy.HotWater'),
-	('energy/ventilation', 'Energy.Ventilation'),
-
-#	('power', ''),  # sum of items below
-	('power/heat-pump', 'Power.HeatPump'),
-	('power/water', 'Power.HotWater'),
-	('power/ventilation', 'Power.Ventilation'),
-
-	('water/temperature/center', 'Temperature.Water.Center'),
-	('water/temperature/bottom', 'Temperature.Water.Bottom'),
-
-	('ventilation/temperature/room', 'Temperature.Room'),
-	('ventilation/temperature/supply', 'Temperature.Air.Supply'),
-	('ventilation/temperature/extract', 'Temperature.Air.Extract'),
-	('ventilation/temperature/outdoor', 'Temperature.Air.Outdoor'),
-	('ventilation/temperature/exhaust', 'Temperature.Air.Exhaust'),
+	('energy', 'Energy.Total', {'interval': 300}),
+	('energy/cooling', 'Energy.Cooling', {'interval': 300}),
+	('energy/heating', 'Energy.Heating', {'interval': 300}),
+	('energy/water', 'Energy.HotWater', {'interval': 300}),
+	('energy/ventilation', 'Energy.Ventilation', {'interval': 300}),
+
+	# total power is derived from items below (see `derived_metrics`)
+	('power/heat-pump', 'Power.HeatPump', {'deadband': 2, 'interval': 30, 'fast_interval': 10}),
+	('power/water', 'Power.HotWater', {'deadband': 2, 'interval': 30, 'fast_interval': 10}),
+	('power/ventilation', 'Power.Ventilation', {'deadband': 2, 'interval': 30, 'fast_interval': 10}),
+	('heat-pump/heating-power', 'HP.HeatingPower', {'deadband': 20, 'interval': 30, 'fast_interval': 10}),
+
+	('water/temperature/center', 'Temperature.Water.Center', {'deadband': 0.1}),
+	('water/temperature/bottom', 'Temperature.Water.Bottom', {'deadband': 0.1}),
+
+	('ventilation/temperature/room', 'Temperature.Room', {'deadband': 0.1}),
+	('ventilation/temperature/supply', 'Temperature.Air.Supply', {'deadband': 0.1}),
+	('ventilation/temperature/extract', 'Temperature.Air.Extract', {'deadband': 0.1}),
+	('ventilation/temperature/outdoor', 'Temperature.Air.Outdoor', {'deadband': 0.1}),
+	('ventilation/temperature/exhaust', 'Temperature.Air.Exhaust', {'deadband': 0.1}),
 	('ventilation/level', 'Ventilation.Level'),
-	('ventilation/volume/supply', 'Ventilation.Supply'),
-	('ventilation/volume/extract', 'Ventilation.Extract'),
+	('ventilation/volume/supply', 'Ventilation.Supply', {'deadband': 1}),
+	('ventilation/volume/extract', 'Ventilation.Extract', {'deadband': 1}),
 
-	('co2', 'CO2'),
-	('status', 'StatusBits'),  # split into status/xyz bits below
+	('co2', 'CO2', {'deadband': 10, 'interval': 30}),
+	('status', 'StatusBits', {'interval': 30, 'fast_interval': 10}),  # split into status/xyz bits below
 ]
 
-# `StatusBits` will be stored as individual bits rather than raw value
-status_bits = [
-	{
-		'mask': 0x0001,
-		'name': 'status/water',
-	},
-	{
-		'mask': 0x0004,
-		'name': 'status/heating',
-	},
-	{
-		'mask': 0x0008,
-		'name': 'status/cooling',
-	},
-	{
-		'mask': 0x0200,
-		'name': 'status/fast-heating',
-	}
+# bits of `StatusBits` that are also published individually as status/<bit> (see `registers.json`)
+status_bits = ['water', 'heating', 'cooling', 'fast-heating']
+
+# values computed from read items after every read and published as extra topics:
+# (topic, metric[, options]) where metric inputs are read names or topics of metrics declared above
+# (see `derived` module), options are the same as in `data_points` (only `deadband` is used)
+derived_metrics = [
+	('power', derived.Sum(['Power.HeatPump', 'Power.HotWater', 'Power.Ventilation']), {'deadband': 2}),
+	('heat-pump/cop', derived.Ratio('HP.HeatingPower', 'Power.HeatPump', min_denominator=50), {'deadband': 0.05}),
+	('energy/rate', derived.Rate('Energy.Total', 3600), {'deadband': 0.01}),		# average kW between reads
+	('energy/delta', derived.Delta('Energy.Total')),							# kWh since previous read
+	('power/mean-15m', derived.RollingMean('power', 15 * 60), {'deadband': 2}),
+	('power/max-1h', derived.RollingMax('power', 60 * 60)),
 ]
 
-# Pichler device client
-device = pichler.Pichler()
+# publish modes (comma separated list in `MQTT_PUBLISH_MODE`, 'topics' by default):
+#   topics - every value to its own topic
+#   json   - all values of cycle in one JSON message to `<prefix>bulk/json`
+#   binary - all values of cycle in one binary frame to `<prefix>bulk/binary`, its schema is retained in `<prefix>bulk/schema`
+# (see `payload` module)
+PUBLISH_MODES = ['topics', 'json', 'binary']
+publish_modes = [m.strip() for m in os.environ.get('MQTT_PUBLISH_MODE', 'topics').split(',') if m.strip()]
+
+# topics of binary frame entries
+bulk_schema = payload.Schema([m[0] for m in set_points] + [d[0] for d in data_points] +
+	['status/' + bit for bit in status_bits] + [m[0] for m in derived_metrics])
+
+# `StatusBits` that switch polling to fast intervals (water heating, defrost)
+fast_status_mask = registers.REGISTERS.datapoints.Mask('StatusBits', ['water', 'defrost'])
+
+# time (in seconds) after which items that couldn't be read are read again (poll interval if it's shorter)
+retry_delay = 10
+
+# time (in seconds) to collect setpoint commands before they are written together
+write_window = 0.5
+
+# directory of local history store (history is not stored if not set)
+history_dir = os.environ.get('HISTORY_DIR')
+
+# default poll interval (seconds)
+poll_interval = float(os.environ.get('POLL_INTERVAL', '60'))
+
+def Option(item, key, default=None):
+	"""Get option of set_points/data_points item"""
+	return item[2].get(key, default) if len(item) > 2 else default
+
+# port of Prometheus metrics endpoint (metrics are not served if not set)
+metrics_port = os.environ.get('METRICS_PORT')
+
+# interval (in seconds) of publishing metrics to `<MQTT_PREFIX>$SYS/...` topics (not published if not set)
+metrics_mqtt_interval = os.environ.get('METRICS_MQTT_INTERVAL')
+
+cycle_duration = metrics.REGISTRY.Histogram('pichler_cycle_duration_seconds', 'Duration of collect cycles', ['device'])
+cycle_errors = metrics.REGISTRY.Counter('pichler_cycle_errors_total', 'Collect cycles that failed', ['device'])
+poll_items_read = metrics.REGISTRY.Counter('pichler_poll_items_total', 'Items read by collect cycles', ['device'])
+poll_overruns = metrics.REGISTRY.Counter('pichler_poll_overruns_total', 'Items that missed their poll deadline', ['device'])
+poll_items_failed = metrics.REGISTRY.Counter('pichler_poll_items_failed_total', 'Items not read by collect cycles (after retries)', ['device'])
+
+# polled items keyed by read name (setpoints are qualified, some names exist in both tables)
+poll_items = dict([('SP:' + m[1], m) for m in set_points] + [(d[1], d) for d in data_points])
+
+class Collector:
+	"""
+	Collects data from single device and publishes them under given MQTT prefix
+	"""
+
+	def __init__(self, device, prefix, interval=None):
+		self.device = device
+		self.prefix = prefix
+		# last read values
+		self.values = {}
+		# prepared reads keyed by names of items that were due together
+		self.prepared = {}
+
+		# setpoint commands are collected for a short time and written together
+		self.writes = writequeue.WriteQueue(device, write_window, self.Confirm, Log)
+
+		# local history of datapoint values
+		self.history = None
+		if history_dir:
+			path = os.path.join(history_dir, prefix.strip('/').replace('/', '_'))
+			self.history = history.HistoryStore([d[1] for d in data_points], path)
+
+		# values computed after every read
+		self.derived = derived.Engine([(m[0], m[1]) for m in derived_metrics])
+		self.derived_options = {m[0]: m[2] if len(m) > 2 else {} for m in derived_metrics}
+
+		interval = interval or poll_interval
+		self.scheduler = scheduler.PollScheduler(
+			{n: Option(m, 'interval', interval) for n, m in poll_items.items()},
+			{n: Option(m, 'fast_interval') for n, m in poll_items.items() if Option(m, 'fast_interval')})
+
+	def Subscribe(self, client):
+		for m in set_points:
+			client.subscribe(self.prefix + m[0] + '/set')
+
+	def PublishBulk(self, values):
+		"""Publish values in one message per bulk mode (see `publish_modes`)
+
+		Parameters
+		----------
+		values : list
+			List of (topic, value) pairs (topics are relative to prefix)
+		"""
+		if not values:
+			return
+		t = time.time()
+		if 'json' in publish_modes:
+			mqtt_publisher.Publish(self.prefix + 'bulk/json', payload.EncodeJson(t, values))
+		if 'binary' in publish_modes:
+			mqtt_publisher.Publish(self.prefix + 'bulk/binary', bulk_schema.Encode(t, values))
+
+	def HandleMessage(self, msg):
+		"""Handle setpoint command, returns False if message doesn't belong to this device
+
+		Command is only queued (see `writequeue.WriteQueue`), device I/O runs on device worker.
+		"""
+		for m in set_points:
+			if msg.topic == (self.prefix + m[0] + '/set'):
+				try:
+					Log(msg.topic + " " + msg.payload.decode())
+					if not debug:
+						self.writes.Put(m[1], float(msg.payload))
+				except Exception as e:
+					Log('Error in SetSetpoint: ' + str(e))
+					traceback.print_exc()
+				return True
+		return False
+
+	def Confirm(self, values):
+		"""Publish setpoint values read back after write"""
+		confirmed = []
+		for m in set_points:
+			if m[1] in values:
+				self.values['SP:' + m[1]] = values[m[1]]
+				confirmed.append((m[0], values[m[1]]))
+				if 'topics' in publish_modes:
+					mqtt_publisher.Publish(self.prefix + m[0], values[m[1]])
+		self.PublishBulk(confirmed)
+
+	def Read(self, names):
+		"""Read given items in one batch
+
+		Items that couldn't be read (even after retries, see `pichler.PreparedRead.ReadPartial`)
+		are logged and left out, so the rest of the batch is still published.
+		"""
+		key = tuple(names)
+		poll = self.prepared.get(key)
+		if poll is None:
+			if len(self.prepared) >= 64:
+				self.prepared.clear()
+			poll = self.prepared[key] = self.device.Prepare(names)
+		r = poll.ReadPartial()
+		failed = [name for name, status in r.status.items() if status != pichler.ITEM_OK]
+		if failed:
+			if not r.values and r.error:
+				raise r.error
+			poll_items_failed.Add(len(failed), self.device.device)
+			Log('%s: %d of %d item(s) not read: %s%s' % (self.prefix, len(failed), len(r.status),
+				', '.join('%s (%s)' % (name, r.status[name]) for name in failed), ' - ' + str(r.error) if r.error else ''))
+		return r.values
+
+	def Collect(self):
+		"""Read items that are due and publish them
+
+		Returns
+		-------
+		float
+			Monotonic time of next deadline
+		"""
+		now = time.monotonic()
+		due = self.scheduler.Due(now)
+		values = {}
+		try:
+			# all values of cycle (published together in bulk modes)
+			cycle = []
+
+			def Publish(name, value, deadband=0):
+				if 'topics' in publish_modes:
+					mqtt_publisher.Publish(self.prefix + name, value, deadband)
+				cycle.append((name, value))
+
+			# read all items that are due (one setpoint and one datapoint RPC at most), publish what was read
+			values = self.Read(due)
+			self.values.update(values)
+			failed = [name for name in due if name not in values]
+
+			if self.history:
+				self.history.Append(time.time(), {d[1]: values[d[1]] for d in data_points if d[1] in values})
+
+			# publish data to MQTT
+			for m in set_points:
+				if 'SP:' + m[1] in values:
+					Publish(m[0], values['SP:' + m[1]], Option(m, 'deadband', 0))
+
+			# report values
+			for m in data_points:
+				if m[1] not in values:
+					continue
+				val = values[m[1]]
+
+				# special handling for StatusBits
+				# report each bit separately
+				if m[0] == 'status':
+					for bit, bval, _ in registers.REGISTERS.datapoints.Bits(m[1], val):
+						if bit in status_bits:
+							Publish('status/' + bit, bval)
+
+				Publish(m[0], val, Option(m, 'deadband', 0))
+
+			# derived values (totals, ratios, rates, rolling windows)
+			for name, value in self.derived.Update(now, values, self.values, failed):
+				Publish(name, value, self.derived_options[name].get('deadband', 0))
+
+			self.PublishBulk(cycle)
+
+		except:
+			cycle_errors.Inc(self.device.device)
+			Log('Unexpected error (%s):' % self.prefix)
+			traceback.print_exc()
+
+		# items that weren't read are retried soon instead of waiting for their next poll
+		read = [name for name in due if name in values]
+		self.scheduler.Retry([name for name in due if name not in values], retry_delay)
+		overruns = self.scheduler.Done(read, now)
+		cycle_duration.Observe(time.monotonic() - now, self.device.device)
+		poll_items_read.Add(len(read), self.device.device)
+		if overruns:
+			poll_overruns.Add(overruns, self.device.device)
+			Log('%s: %d item(s) missed poll deadline (jitter mean %.3f s, max %.3f s)' %
+				(self.prefix, overruns, self.scheduler.JitterMean(), self.scheduler.jitter_max))
+		DebugLog('%s: read %d of %d item(s), %.3f s' % (self.prefix, len(read), len(due), time.monotonic() - now))
+
+		# poll faster while unit is in active state
+		if 'StatusBits' in self.values:
+			self.scheduler.SetFast((int(self.values['StatusBits']) & fast_status_mask) != 0)
+
+		if mqtt_spool:
+			mqtt_spool.Sync()
+
+		return self.scheduler.NextDeadline()
+
+# MQTT publisher and spool of unpublished messages (created when run as script)
+mqtt_publisher = None
+mqtt_spool = None
 
 def on_connect(client, userdata, flags, reason_code, properties):
 	DebugLog(f"on_connect: {reason_code}, {flags}")
-	for m in set_points:
-		client.subscribe(MQTT_PREFIX + m[0] + '/set')
+	if mqtt_spool and mqtt_spool.depth:
+		Log('MQTT connected, replaying %d spooled messages' % mqtt_spool.depth)
+	# publish everything again after (re)connect
+	mqtt_publisher.Reset()
+	for c in collectors:
+		c.Subscribe(client)
+		if 'binary' in publish_modes:
+			Send(c.prefix + 'bulk/schema', bulk_schema.Json(), True)
 
 def on_message(client, userdata, msg):
 	DebugLog(f"on_message: {msg.topic}")
-	for m in set_points:
-		if msg.topic == (MQTT_PREFIX + m[0] + '/set'):
-			try:
-				Log(msg.topic + " " + msg.payload.decode())
-				if not debug:
-					device.SetSetpoint(m[1], float(msg.payload))
-			except Exception as e:
-				Log('Error in SetSetpoint: ' + str(e))
-				traceback.print_exc()
-
-client = mqtt.Client(mqtt.CallbackAPIVersion.VERSION2)
-client.on_connect = on_connect
-client.on_message = on_message
-
-mqtt_host = os.environ['MQTT_HOST']
-mqtt_port = os.environ.get('MQTT_PORT', '1883')
-
-Log("Connecting to MQTT")
-
-while True:
-	try:
-		client.connect(mqtt_host, int(mqtt_port), 60)
-		break
-	except Exception as e:
-		Log('MQTT connect: ' + str(e))
-	time.sleep(10)
-
-client.loop_start()
-
-Log('Collecting data')
-
-while True:
-
-	try:
-		def Publish(name, value):
-			if not debug:
-				client.publish(MQTT_PREFIX + name, value)
-			else:
-				DebugLog(f"publish: {name} = {value}")
-
-		# publish data to MQTT
-		for m in set_points:
-			Publish(m[0], device.GetSetpoint(m[1]))
+	for c in collectors:
+		if c.HandleMessage(msg):
+			break
+
+def Publish(topic, value, retain):
+	"""Publish message to broker, returns False if message wasn't queued for sending"""
+	if not client.is_connected():
+		return False
+	return client.publish(topic, value, retain=retain).rc == mqtt.MQTT_ERR_SUCCESS
+
+def Send(topic, value, retain):
+	if debug:
+		DebugLog(f"publish: {topic} = {value}")
+		return
+	# keep order of messages: new messages go to spool until spool is replayed
+	if mqtt_spool and mqtt_spool.depth:
+		mqtt_spool.Append(topic, value, retain)
+	elif not Publish(topic, value, retain) and mqtt_spool:
+		mqtt_spool.Append(topic, value, retain)
+
+def RegisterMetrics():
+	"""Export statistics kept by publisher, spool, schedulers and write queues"""
+	registry = metrics.REGISTRY
+	registry.Callback('pichler_mqtt_messages_total', 'MQTT messages by result of change-only filtering', 'counter', ['result'],
+		lambda: [(('sent',), mqtt_publisher.sent), (('suppressed',), mqtt_publisher.suppressed)])
+	if mqtt_spool:
+		registry.Callback('pichler_spool_depth', 'Messages waiting in spool', 'gauge', [], lambda: [((), mqtt_spool.depth)])
+		registry.Callback('pichler_spool_dropped_total', 'Messages dropped from spool', 'counter', [], lambda: [((), mqtt_spool.dropped)])
+		registry.Callback('pichler_spool_replayed_total', 'Messages replayed from spool', 'counter', [], lambda: [((), mqtt_spool.replayed)])
+	registry.Callback('pichler_poll_jitter_seconds', 'Delay of item reads after their deadline', 'gauge', ['device', 'stat'],
+		lambda: [(s, v) for c in collectors for s, v in (
+			((c.device.device, 'max'), c.scheduler.jitter_max), ((c.device.device, 'mean'), c.scheduler.JitterMean()))])
+	registry.Callback('pichler_worker_queue_depth', 'Device calls waiting in worker queue', 'gauge', ['worker'],
+		lambda: [((c.device.worker.name,), c.device.worker.depth) for c in collectors if c.device.worker])
+	registry.Callback('pichler_setpoint_writes_total', 'Setpoint values written', 'counter', ['device'],
+		lambda: [((c.device.device,), c.writes.written) for c in collectors])
+	registry.Callback('pichler_device_overruns_total', 'Collect cycles that didn\'t finish within cycle', 'counter', [],
+		lambda: [((), device_scheduler.overruns)])
+	registry.Callback('pichler_cache_requests_total', 'Read cache requests by result', 'counter', ['device', 'result'],
+		lambda: [((c.device.device, k), getattr(c.device.cache, k)) for c in collectors if c.device.cache
+			for k in ('hits', 'misses', 'merged')])
+
+def PublishMetrics(interval):
+	"""Publish metrics to `<MQTT_PREFIX>$SYS/<metric>/<label values>` topics (runs forever)"""
+	while True:
+		time.sleep(interval)
+		for name, labels, values, value in metrics.REGISTRY.Samples():
+			if name.endswith('_bucket'):
+				continue
+			Publish(MQTT_PREFIX + '$SYS/' + '/'.join((name,) + tuple(str(v) for v in values)), value, False)
+
+if __name__ == '__main__':
+	# Pichler device clients
+	fleet_config = os.environ.get('PICHLER_FLEET')
+	if fleet_config:
+		# fleet mode: one shared Nabto client, one session per device
+		config = fleet.LoadConfig(fleet_config)
+		nabto_client = pichler.Pichler.CreateClient()
+		collectors = []
+		for d in config['devices']:
+			Log('Connecting to %s' % d['id'])
+			device = pichler.Pichler(d['id'], d['user'], d['password'], client=nabto_client, worker=worker.DeviceWorker(d['id']))
+			collectors.append(Collector(device, d['prefix'], config.get('cycle')))
+		cycle = config.get('cycle', poll_interval)
+		workers = config.get('workers', 8)
+	else:
+		collectors = [Collector(pichler.Pichler(worker=worker.DeviceWorker()), MQTT_PREFIX)]
+		cycle = poll_interval
+		workers = 1
+
+	client = mqtt.Client(mqtt.CallbackAPIVersion.VERSION2)
+	client.on_connect = on_connect
+	client.on_message = on_message
+
+	mqtt_host = os.environ['MQTT_HOST']
+	mqtt_port = os.environ.get('MQTT_PORT', '1883')
+	mqtt_refresh = os.environ.get('MQTT_REFRESH')
+	mqtt_retain = os.environ.get('MQTT_RETAIN', '0') == '1'
+	unknown = set(publish_modes) - set(PUBLISH_MODES)
+	if unknown:
+		raise ValueError('Unknown MQTT_PUBLISH_MODE %s (use %s)' % (', '.join(sorted(unknown)), ','.join(PUBLISH_MODES)))
+
+	spool_dir = os.environ.get('SPOOL_DIR')
+	spool_size = int(os.environ.get('SPOOL_SIZE', str(64 * 1024 * 1024)))
+	spool_rate = float(os.environ.get('SPOOL_RATE', '50'))
 
-		# read actual values
-		values = device.GetDatapoints([d[1] for d in data_points])
+	# messages that can't be published are stored in spool and replayed after reconnect
+	mqtt_spool = spool.Spool(spool_dir, spool_size) if spool_dir else None
 
-		# report values
-		for i in range(len(data_points)):
-			val = values[i]
+	# change-only publishing is enabled by MQTT_REFRESH (interval of full refresh in seconds)
+	mqtt_publisher = publisher.Publisher(Send, float(mqtt_refresh) if mqtt_refresh else None, mqtt_retain)
 
-			# special handling for StatusBits
-			# report each bit separately
-			if data_points[i][0] == 'status':
-				for d in status_bits:
-					bval = 1 if (values[i] & d['mask']) != 0 else 0
-					Publish(d['name'], bval)
+	Log("Connecting to MQTT")
 
-			Publish(data_points[i][0], val)
+	# connect on background (and reconnect whenever connection is lost), data are collected meanwhile
+	client.reconnect_delay_set(1, 60)
+	client.connect_async(mqtt_host, int(mqtt_port), 60)
+	client.loop_start()
 
-		# get total power consumption (accumulate all power comsumption values)
-		power_total = 0
-		for i in range(len(data_points)):
-			if data_points[i][0].startswith('power/'):
-				power_total += values[i]
+	if mqtt_spool:
+		if mqtt_spool.depth:
+			Log('Spool contains %d messages' % mqtt_spool.depth)
+		threading.Thread(target=mqtt_spool.Replay, args=(Publish, client.is_connected, spool_rate, Log), daemon=True).start()
 
-		Publish('power', power_total)
+	# read items when they are due (see `interval` options)
+	device_scheduler = fleet.DeviceScheduler(cycle, workers, Log)
 
-	except:
-		Log('Unexpected error:')
-		traceback.print_exc()
+	RegisterMetrics()
+	if metrics_port:
+		metrics.Serve(int(metrics_port))
+		Log('Serving metrics on port %s' % metrics_port)
+	if metrics_mqtt_interval:
+		threading.Thread(target=PublishMetrics, args=(float(metrics_mqtt_interval),), daemon=True).start()
 
-	# wait a minute
-	time.sleep(60)
+	Log('Collecting data')
+	device_scheduler.Run({c.prefix: c.Collect for c in collectors})
@@ -0,0 +1,323 @@
+"""
+Local daemon that keeps warm session to Pichler unit and serves other processes over Unix domain socket
+
+Run `python daemon.py` on background, then `daemon.Connect()` returns client of running daemon
+(or new `pichler.Pichler` instance if no daemon is running).
+
+Protocol is one JSON object per line in both directions:
+	{"op": "ping"}                                  -> {"result": {...}}
+	{"op": "read", "names": ["CO2", "SP:OperatingMode"]} -> {"result": [650, 3]}
+	{"op": "write", "values": [["OperatingMode", 3]]}    -> {"result": null}
+	{"op": "snapshot"}                              -> {"result": {"time": ..., "datapoints": {...}, "setpoints": {...}}}
+Failed requests are answered by {"error": "message", "type": "KeyError|ValueError|RuntimeError"}.
+"""
+
+import os
+import sys
+import json
+import time
+import signal
+import socket
+import argparse
+import threading
+import socketserver
+import concurrent.futures
+import cache
+import worker
+import pichler
+
+def DefaultPath():
+	"""Get socket path (`PICHLER_SOCKET` environment variable or per-user file in temp directory)"""
+	path = os.environ.get('PICHLER_SOCKET')
+	if path:
+		return path
+	uid = os.getuid() if hasattr(os, 'getuid') else 0
+	return os.path.join('/tmp', 'pichler-%d.sock' % uid)
+
+class ReadBatcher:
+	"""
+	Merges reads requested within short window into one read
+
+	First caller waits for `window`, then reads items requested by all callers meanwhile
+	(values of items are then shared by all callers).
+	"""
+
+	def __init__(self, read, window=0.02):
+		"""
+		Parameters
+		----------
+		read : callable
+			Function that reads items: read(keys) -> dict of values keyed by key
+		window : float, optional
+			Time (in seconds) to collect requests, by default 0.02
+		"""
+		self.read = read
+		self.window = window
+		self.batches = 0
+		self.requests = 0
+		self._lock = threading.Lock()
+		self._batch = None
+
+	def Read(self, keys):
+		"""Read items (together with items requested by other callers)
+
+		Returns
+		-------
+		dict
+			Values keyed by key (contains at least requested keys)
+		"""
+		with self._lock:
+			self.requests += 1
+			batch = self._batch
+			leader = batch is None
+			if leader:
+				batch = self._batch = ({}, concurrent.futures.Future())
+			batch[0].update(dict.fromkeys(keys))
+
+		if leader:
+			time.sleep(self.window)
+			with self._lock:
+				self._batch = None
+				self.batches += 1
+			try:
+				batch[1].set_result(self.read(list(batch[0])))
+			except Exception as e:
+				batch[1].set_exception(e)
+		return batch[1].result()
+
+class Server(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+	"""
+	Serves requests of local clients using single `pichler.Pichler` instance
+
+	Reads are served from cache (`cache.ReadCache`), misses of concurrent requests
+	are merged into single `Pichler.Poll` (see `ReadBatcher`).
+	"""
+
+	daemon_threads = True
+
+	# time (in seconds) ping response is reused
+	ping_ttl = 60
+
+	def __init__(self, device, path=None, window=0.02):
+		"""
+		Parameters
+		----------
+		device : pichler.Pichler
+			Connected device (its cache is used if set, otherwise default `cache.ReadCache` is created)
+		path : str, optional
+			Socket path, by default `DefaultPath()`
+		window : float, optional
+			Time (in seconds) to collect concurrent reads, by default 0.02
+		"""
+		self.device = device
+		self.path = path or DefaultPath()
+		self.cache = device.cache or cache.ReadCache()
+		self.batcher = ReadBatcher(device.Poll, window)
+		self._ping = (None, 0)
+
+		# remove stale socket of daemon that is not running anymore
+		if os.path.exists(self.path):
+			try:
+				with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as s:
+					s.connect(self.path)
+				raise RuntimeError('Daemon is already running (%s)' % self.path)
+			except ConnectionRefusedError:
+				os.remove(self.path)
+
+		# socket is created with owner-only permissions (other users could write setpoints)
+		umask = os.umask(0o177)
+		try:
+			super().__init__(self.path, Handler)
+		finally:
+			os.umask(umask)
+		os.chmod(self.path, 0o600)
+
+	def server_close(self):
+		super().server_close()
+		if os.path.exists(self.path):
+			os.remove(self.path)
+
+	def _Keys(self, names):
+		keys = []
+		for name in names:
+			kind, _, _ = self.device.Resolve(name)
+			keys.append(kind + ':' + name.rpartition(':')[2])
+		return keys
+
+	def Read(self, names):
+		return self.cache.Get(self._Keys(names), self.batcher.Read)
+
+	def Write(self, values):
+		self.device.SetSetpoints(values)
+		self.cache.Invalidate(['SP:' + sp for sp, _ in values])
+
+	def Snapshot(self):
+		dps = list(self.device.DP)
+		sps = list(self.device.SP)
+		# time of the oldest value (cached values can be up to their TTL old)
+		values, t = self.cache.GetTimed(self._Keys(dps + ['SP:' + sp for sp in sps]), self.batcher.Read)
+		return {
+			'time': t,
+			'datapoints': dict(zip(dps, values)),
+			'setpoints': dict(zip(sps, values[len(dps):])),
+		}
+
+	def Ping(self):
+		response, expiration = self._ping
+		if response is None or expiration <= time.monotonic():
+			response = self.device.Ping()
+			self._ping = (response, time.monotonic() + self.ping_ttl)
+		return response
+
+	def Handle(self, request):
+		op = request.get('op')
+		if op == 'read':
+			return self.Read(request['names'])
+		if op == 'write':
+			return self.Write(request['values'])
+		if op == 'snapshot':
+			return self.Snapshot()
+		if op == 'ping':
+			return self.Ping()
+		raise ValueError('Unknown request %r' % op)
+
+class Handler(socketserver.StreamRequestHandler):
+	def handle(self):
+		for line in self.rfile:
+			try:
+				response = {'result': self.server.Handle(json.loads(line))}
+			except Exception as e:
+				kind = type(e).__name__ if isinstance(e, (KeyError, ValueError)) else 'RuntimeError'
+				response = {'error': str(e.args[0]) if isinstance(e, KeyError) and e.args else str(e), 'type': kind}
+			self.wfile.write((json.dumps(response) + '\n').encode())
+			self.wfile.flush()
+
+class Client:
+	"""
+	Client of running daemon with the same read/write methods as `pichler.Pichler`
+
+	Methods
+	-------
+	GetDatapoint(dp), GetDatapoints(dps)
+		Get value(s) of datapoint(s)
+
+	GetSetpoint(sp), GetSetpoints(sps)
+		Get value(s) of setpoint(s)
+
+	SetSetpoint(sp, value), SetSetpoints(sps)
+		Set value(s) of setpoint(s)
+
+	Poll(names)
+		Get values of multiple datapoints and setpoints
+
+	Snapshot()
+		Get values of all datapoints and setpoints
+
+	Ping()
+		Ping device
+	"""
+
+	DP = pichler.Pichler.DP
+	SP = pichler.Pichler.SP
+
+	def __init__(self, path=None, timeout=30):
+		"""
+		Parameters
+		----------
+		path : str, optional
+			Socket path, by default `DefaultPath()`
+		timeout : float, optional
+			Timeout (in seconds) of single request, by default 30
+		"""
+		self.path = path or DefaultPath()
+		self._socket = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+		self._socket.settimeout(timeout)
+		self._socket.connect(self.path)
+		self._file = self._socket.makefile('rwb')
+		self._lock = threading.Lock()
+
+	def Close(self):
+		self._file.close()
+		self._socket.close()
+
+	def Request(self, op, **params):
+		"""Send request to daemon and return its result"""
+		params['op'] = op
+		with self._lock:
+			self._file.write((json.dumps(params) + '\n').encode())
+			self._file.flush()
+			line = self._file.readline()
+		if not line:
+			raise RuntimeError('Daemon closed connection')
+		response = json.loads(line)
+		if 'error' in response:
+			raise {'KeyError': KeyError, 'ValueError': ValueError}.get(response.get('type'), RuntimeError)(response['error'])
+		return response['result']
+
+	def Ping(self):
+		return self.Request('ping')
+
+	def Poll(self, names, parallel=True):
+		return dict(zip(names, self.Request('read', names=list(names))))
+
+	def GetDatapoint(self, dp):
+		return self.GetDatapoints([dp])[0]
+
+	def GetDatapoints(self, dps):
+		return self.Request('read', names=['DP:' + dp for dp in dps])
+
+	def GetSetpoint(self, sp):
+		return self.GetSetpoints([sp])[0]
+
+	def GetSetpoints(self, sps):
+		return self.Request('read', names=['SP:' + sp for sp in sps])
+
+	def SetSetpoint(self, sp, value):
+		self.SetSetpoints([[sp, value]])
+
+	def SetSetpoints(self, sps):
+		self.Request('write', values=[list(sp) for sp in sps])
+
+	def Snapshot(self):
+		r = self.Request('snapshot')
+		return pichler.Snapshot(r['time'], r['datapoints'], r['setpoints'])
+
+def Connect(path=None):
+	"""Connect to running daemon, or directly to device if daemon isn't running
+
+	Parameters
+	----------
+	path : str, optional
+		Socket path, by default `DefaultPath()`
+
+	Returns
+	-------
+	Client, pichler.Pichler
+		Daemon client or new device instance
+	"""
+	if hasattr(socket, 'AF_UNIX'):
+		try:
+			return Client(path)
+		except OSError:
+			pass
+	return pichler.Pichler(worker=worker.DeviceWorker())
+
+def main():
+	parser = argparse.ArgumentParser(description='Keep session to Pichler unit and serve local clients')
+	parser.add_argument('--socket', default=DefaultPath(), help='socket path (PICHLER_SOCKET by default)')
+	parser.add_argument('--window', type=float, default=0.02, help='time (in seconds) to merge concurrent reads')
+	args = parser.parse_args()
+
+	# handler threads share the session, device calls run one by one on worker thread
+	server = Server(pichler.Pichler(worker=worker.DeviceWorker()), args.socket, args.window)
+	print('Serving on %s' % server.path)
+	signal.signal(signal.SIGTERM, lambda *args: sys.exit(0))
+	try:
+		server.serve_forever()
+	except KeyboardInterrupt:
+		pass
+	finally:
+		server.server_close()
+
+if __name__ == '__main__':
+	main()
@@ -0,0 +1,242 @@
+"""
+Streaming computation of derived values (totals, ratios, counter deltas/rates, rolling windows)
+
+Metrics are declared as list of (name, metric) pairs and evaluated by `Engine` after every read.
+Inputs of metric are names of read items or names of metrics declared before it.
+"""
+
+from collections import deque
+
+class Metric:
+	"""
+	Base of derived metrics
+
+	Attributes
+	----------
+	inputs : list
+		Names of input values
+	"""
+
+	def __init__(self, inputs):
+		self.inputs = list(inputs)
+
+	def Update(self, t, values):
+		"""Compute new value
+
+		Parameters
+		----------
+		t : float
+			Monotonic time of read
+		values : list
+			Current values of inputs (same order as `inputs`)
+
+		Returns
+		-------
+		int, float
+			New value or None if there's no value yet
+		"""
+		raise NotImplementedError
+
+class Sum(Metric):
+	"""Sum of inputs"""
+
+	def Update(self, t, values):
+		return sum(values)
+
+class Ratio(Metric):
+	"""Ratio of two inputs (e.g. COP = heating power / consumed power)"""
+
+	def __init__(self, numerator, denominator, min_denominator=0, default=0):
+		"""
+		Parameters
+		----------
+		numerator, denominator : str
+			Input names
+		min_denominator : float, optional
+			Smaller denominator gives `default` (e.g. heat pump is off), by default 0
+		default : float, optional
+			Value used when denominator is too small, by default 0
+		"""
+		super().__init__([numerator, denominator])
+		self.min_denominator = min_denominator
+		self.default = default
+
+	def Update(self, t, values):
+		numerator, denominator = values
+		if denominator <= self.min_denominator:
+			return self.default
+		return numerator / denominator
+
+class Delta(Metric):
+	"""
+	Increase of counter between two reads
+
+	Counter that drops by more than half of its range is considered wrapped around,
+	smaller drop is considered reset (increase since reset is counted).
+	"""
+
+	def __init__(self, counter, wrap=65536):
+		"""
+		Parameters
+		----------
+		counter : str
+			Input name
+		wrap : int, optional
+			Range of counter (value after which it starts from 0), by default 65536 (uint16)
+		"""
+		super().__init__([counter])
+		self.wrap = wrap
+		self._last = None
+
+	def Change(self, value):
+		last = self._last
+		self._last = value
+		if last is None:
+			return None
+		delta = value - last
+		if delta < 0:
+			delta = delta + self.wrap if -delta > self.wrap / 2 else value
+		return delta
+
+	def Update(self, t, values):
+		return self.Change(values[0])
+
+class Rate(Delta):
+	"""Average increase of counter per `unit` seconds between two reads (e.g. kWh per hour = kW)"""
+
+	def __init__(self, counter, unit=3600, wrap=65536):
+		super().__init__(counter, wrap)
+		self.unit = unit
+		self._time = None
+
+	def Update(self, t, values):
+		last, self._time = self._time, t
+		delta = self.Change(values[0])
+		if delta is None or t <= last:
+			return None
+		return delta * self.unit / (t - last)
+
+class RollingMean(Metric):
+	"""Mean of input over time window (O(1) per update)"""
+
+	def __init__(self, name, window):
+		"""
+		Parameters
+		----------
+		name : str
+			Input name
+		window : float
+			Length of window in seconds
+		"""
+		super().__init__([name])
+		self.window = window
+		self._samples = deque()
+		self._sum = 0.0
+
+	def Update(self, t, values):
+		self._samples.append((t, values[0]))
+		self._sum += values[0]
+		while self._samples[0][0] <= t - self.window:
+			self._sum -= self._samples.popleft()[1]
+		return self._sum / len(self._samples)
+
+class RollingMax(Metric):
+	"""Maximum of input over time window (monotonic deque, amortized O(1) per update)"""
+
+	sign = 1
+
+	def __init__(self, name, window):
+		"""
+		Parameters
+		----------
+		name : str
+			Input name
+		window : float
+			Length of window in seconds
+		"""
+		super().__init__([name])
+		self.window = window
+		# (time, value) with decreasing values (times sign), head is the extreme
+		self._samples = deque()
+
+	def Update(self, t, values):
+		value = values[0] * self.sign
+		samples = self._samples
+		while samples and samples[-1][1] <= value:
+			samples.pop()
+		samples.append((t, value))
+		while samples[0][0] <= t - self.window:
+			samples.popleft()
+		return samples[0][1] * self.sign
+
+class RollingMin(RollingMax):
+	"""Minimum of input over time window (amortized O(1) per update)"""
+
+	sign = -1
+
+class Engine:
+	"""
+	Evaluates declared metrics after every read
+
+	Metric is evaluated when any of its inputs was updated by the read and all its inputs are known.
+	Metrics with inputs that failed to be read (or computed from such metrics) are skipped,
+	so they aren't computed from stale values.
+
+	Methods
+	-------
+	Update(t, changed, values, failed)
+		Evaluate metrics affected by read
+	"""
+
+	def __init__(self, metrics):
+		"""
+		Parameters
+		----------
+		metrics : list
+			List of (name, metric) pairs, metric can use names of metrics declared before it
+		"""
+		self.metrics = list(metrics)
+		# last values of metrics
+		self.values = {}
+
+	def Update(self, t, changed, values, failed=()):
+		"""Evaluate metrics affected by read
+
+		Parameters
+		----------
+		t : float
+			Monotonic time of read
+		changed : iterable
+			Names of items updated by read
+		values : dict
+			Last known values of all read items
+		failed : iterable, optional
+			Names of items that should have been read but weren't, by default ()
+
+		Returns
+		-------
+		list
+			List of (name, value) of updated metrics (in order of declaration)
+		"""
+		changed = set(changed)
+		failed = set(failed)
+		r = []
+		for name, metric in self.metrics:
+			if any(i in failed for i in metric.inputs):
+				failed.add(name)
+				continue
+			if not any(i in changed for i in metric.inputs):
+				continue
+			inputs = []
+			for i in metric.inputs:
+				value = self.values[i] if i in self.values else values.get(i)
+				if value is None:
+					break
+				inputs.append(value)
+			else:
+				value = metric.Update(t, inputs)
+				if value is not None:
+					self.values[name] = value
+					changed.add(name)
+					r.append((name, value))
+		return r
@@ -0,0 +1,295 @@
+"""
+Fake Nabto client library (stand-in for PKOM4 unit and `libnabto_client_api`)
+
+Serves queries from `unabto_queries.xml` out of in-memory register model,
+so everything can be run and measured without real unit:
+```python
+client = nabto.Client(home, library=fakenabto.FakeLibrary(latency=0.05))
+device = pichler.Pichler('fake', 'user', 'password', client=client)
+```
+or set `NABTO_BACKEND=fake` environment variable (see `FakeLibrary.FromEnvironment`).
+"""
+
+import os
+import json
+import time
+import random
+import threading
+import urllib.parse
+from collections import Counter
+import nabtoapi
+from nabtoapi import NabtoError
+import pichler
+
+# initial raw register values: (table, address, object): value
+REGISTERS = {
+	('DP', 152, 1): 0x0004,		# StatusBits (heating)
+	('DP', 34, 0): 0,			# Malfunction
+	('DP', 153, 1): 650,		# CO2
+	('DP', 154, 1): 45,			# Humidity
+	('DP', 44, 0): 412,			# SCOP
+	('DP', 45, 0): 385,			# HP.COP
+	('DP', 37, 0): 1850,		# HP.HeatingPower
+
+	('DP', 65, 0): 15230,		# Energy.Total
+	('DP', 64, 0): 8120,		# Energy.Heating
+	('DP', 27, 0): 310,			# Energy.Cooling
+	('DP', 38, 0): 4250,		# Energy.HotWater
+	('DP', 29, 0): 2550,		# Energy.Ventilation
+
+	('DP', 25, 0): 4805,		# Power.HeatPump
+	('DP', 24, 0): 0,			# Power.HotWater
+	('DP', 26, 0): 352,			# Power.Ventilation
+
+	('DP', 19, 0): 2175,		# Temperature.Room
+
+	('DP', 1, 1): 2050,			# Temperature.Air.Supply
+	('DP', 6, 1): 2210,			# Temperature.Air.Extract
+	('DP', 2, 1): 380,			# Temperature.Air.Outdoor
+	('DP', 3, 1): 610,			# Temperature.Air.Exhaust
+
+	('DP', 12, 1): 4870,		# Temperature.Water.Center
+	('DP', 13, 1): 4420,		# Temperature.Water.Bottom
+
+	('DP', 41, 1): 2,			# Ventilation.Level
+	('DP', 22, 0): 1520,		# Ventilation.Supply
+	('DP', 23, 0): 1490,		# Ventilation.Extract
+
+	('SP', 16, 0): 1,			# CO2.Avail
+	('SP', 18, 2): 1560,		# FilterChange
+	('SP', 5, 0): 0,			# EquipmentType
+	('SP', 136, 0): 0,			# HotWater.E.Heating
+	('SP', 106, 0): 0,			# HotWater.Fast.Heating
+	('SP', 129, 0): 5000,		# HotWater.Temperature
+	('SP', 15, 2): 1,			# KWH.COP.Reset.Day
+	('SP', 16, 2): 1,			# KWH.COP.Reset.Month
+	('SP', 17, 2): 20,			# KWH.COP.Reset.Year
+	('SP', 2, 6): 0,			# OperatingMode.Holiday.Day
+	('SP', 1, 6): 0,			# OperatingMode.Holiday.Month
+	('SP', 0, 6): 0,			# OperatingMode.Holiday.Year
+	('SP', 0, 0): 3,			# OperatingMode
+	('SP', 10, 0): 2150,		# Temperature.Normal
+	('SP', 19, 0): 2600,		# Temperature.ActiveCooling
+	('SP', 9, 0): 0,			# ActiveCooling.Mode
+	('SP', 46, 0): 2,			# Ventilation.Level
+	('SP', 45, 0): 50,			# Ventilation.Balance
+}
+
+# response to ping query
+PING = {
+	'Pong': 0x706F6E67,
+	'Devicenumber': 1,
+	'Model': 4,
+	'Version HP': 100,
+	'Version NP': 100,
+	'Version HBDE': 100,
+	'UserNames:': 'user',
+}
+
+# queries answered with status only
+STATUS_QUERIES = ['admincmd', 'updateuser', 'prepareUpdate', 'eepReadRaw', 'eepWriteRaw', 'flashRead', 'flashWrite']
+
+def _Int16(value):
+	value = int(value) & 0xFFFF
+	return value - 0x10000 if value & 0x8000 else value
+
+class FakeLibrary:
+	"""
+	Drop-in replacement of `nabtoapi.Library` backed by register model.
+
+	Setpoint writes are stored to read addresses of the setpoints (see `pichler.Pichler.SP`),
+	other addresses read 0 until they are set.
+
+	Attributes
+	----------
+	calls : collections.Counter
+		Number of RPCs keyed by command
+	failures : int
+		Number of injected failures
+	devices : list
+		Devices found by local discovery (`GetLocalDevices`), e.g. ['<id>.local.lscontrol.dk']
+
+	Methods
+	-------
+	Get(table, address, obj)
+		Get raw register value
+
+	Set(table, address, obj, value)
+		Set raw register value
+
+	FromEnvironment()
+		Create library configured by environment variables
+
+	Outage(duration)
+		Drop all sessions and refuse new ones for given time
+	"""
+
+	def __init__(self, latency=0.0, jitter=0.0, failure_rate=0.0, registers=None, max_list=None, max_range=None, seed=None, host_latency=None):
+		"""
+		Parameters
+		----------
+		latency : float, optional
+			Time (in seconds) each RPC takes, by default 0
+		jitter : float, optional
+			Random time (in seconds, uniformly distributed) added to latency, by default 0
+		failure_rate : float, optional
+			Probability of RPC failure (0-1), by default 0
+		registers : dict, optional
+			Initial raw register values, by default `REGISTERS`
+		max_list : int, optional
+			Maximal number of items in list request (longer lists fail), by default unlimited
+		max_range : int, optional
+			Maximal number of values returned by range request (longer ranges are truncated), by default unlimited
+		seed : int, optional
+			Seed of random generator used for jitter and failures, by default None
+		host_latency : dict, optional
+			Latency of RPCs keyed by device host (overrides `latency`, None = host is unreachable), by default {}
+		"""
+		self.latency = latency
+		self.jitter = jitter
+		self.failure_rate = failure_rate
+		self.max_list = max_list
+		self.max_range = max_range
+		self.registers = dict(REGISTERS if registers is None else registers)
+		self.calls = Counter()
+		self.failures = 0
+		self.devices = []
+		self.host_latency = dict(host_latency or {})
+		self._random = random.Random(seed)
+		self._lock = threading.Lock()
+		self._sessions = set()
+		self._next_session = 1
+		self._outage_end = 0.0
+		self._write_map = {sp.addr_w: sp.addr_r for sp in pichler.Pichler.SP.values() if sp.addr_w}
+
+	@classmethod
+	def FromEnvironment(cls):
+		"""Create library configured by `NABTO_FAKE_LATENCY`, `NABTO_FAKE_JITTER`, `NABTO_FAKE_FAILURES`
+		and `NABTO_FAKE_SEED` environment variables"""
+		seed = os.environ.get('NABTO_FAKE_SEED')
+		return cls(
+			float(os.environ.get('NABTO_FAKE_LATENCY', '0')),
+			float(os.environ.get('NABTO_FAKE_JITTER', '0')),
+			float(os.environ.get('NABTO_FAKE_FAILURES', '0')),
+			seed=int(seed) if seed else None)
+
+	def Outage(self, duration):
+		"""Drop all sessions (RPCs fail by `NABTO_INVALID_SESSION`)
+		and refuse new ones for given time (in seconds) by `NABTO_NO_NETWORK`"""
+		with self._lock:
+			self._sessions.clear()
+			self._outage_end = time.monotonic() + duration
+
+	def Get(self, table, address, obj):
+		"""Get raw register value ('DP' or 'SP' table)"""
+		return self.registers.get((table, address, obj), 0)
+
+	def Set(self, table, address, obj, value):
+		"""Set raw register value ('DP' or 'SP' table)"""
+		with self._lock:
+			self.registers[(table, address, obj)] = _Int16(value)
+
+	def Startup(self, home):
+		pass
+
+	def Shutdown(self):
+		pass
+
+	def InstallDefaultStaticResources(self):
+		pass
+
+	def SetOption(self, name, value):
+		pass
+
+	def GetLocalDevices(self):
+		return list(self.devices)
+
+	def CreateProfile(self, user, pwd):
+		pass
+
+	def OpenSession(self, user, pwd):
+		with self._lock:
+			if time.monotonic() < self._outage_end:
+				raise NabtoError('nabtoOpenSession', nabtoapi.NABTO_NO_NETWORK)
+			session = self._next_session
+			self._next_session += 1
+			self._sessions.add(session)
+		return session
+
+	def CloseSession(self, session):
+		with self._lock:
+			self._sessions.discard(session)
+
+	def RpcSetDefaultInterface(self, session, interfaceDefinition):
+		if session not in self._sessions:
+			raise NabtoError('nabtoRpcSetDefaultInterface', nabtoapi.NABTO_INVALID_SESSION)
+
+	def RpcInvoke(self, session, nabtoUrl):
+		url = nabtoUrl.decode() if isinstance(nabtoUrl, bytes) else nabtoUrl
+		path, _, query = url.partition('?')
+		host = path.partition('://')[2].partition('/')[0]
+		command = path.rsplit('/', 1)[-1]
+		if command.endswith('.json'):
+			command = command[:-5]
+
+		with self._lock:
+			self.calls[command] += 1
+			fail = self.failure_rate and self._random.random() < self.failure_rate
+			if fail:
+				self.failures += 1
+			latency = self.host_latency.get(host, self.latency)
+			delay = (latency or 0) + (self._random.uniform(0, self.jitter) if self.jitter else 0)
+
+		if delay > 0:
+			time.sleep(delay)
+		if session not in self._sessions:
+			raise NabtoError('nabtoRpcInvoke', nabtoapi.NABTO_INVALID_SESSION)
+		if latency is None:
+			raise NabtoError('nabtoRpcInvoke', nabtoapi.NABTO_CONNECT_TO_HOST_FAILED)
+		if fail:
+			raise NabtoError('nabtoRpcInvoke', nabtoapi.NABTO_FAILED)
+
+		if query.startswith('json='):
+			params = json.loads(urllib.parse.unquote(query[5:]))['request']
+		else:
+			params = {k: int(v) for k, v in urllib.parse.parse_qsl(query)}
+
+		# round trip through JSON text, as real library returns
+		return json.loads(json.dumps({'response': self._Query(command, params)}))
+
+	def _Query(self, command, params):
+		if command == 'ping':
+			return dict(PING)
+		if command in STATUS_QUERIES:
+			return {'status': 0}
+		if command in ('getdebug', 'writetdebug'):
+			return {'info': ''}
+
+		if command in ('datapointReadValue', 'setpointReadValue'):
+			table = 'DP' if command.startswith('datapoint') else 'SP'
+			address, obj = params['address'], params['obj']
+			length = params['length'] if self.max_range is None else min(params['length'], self.max_range)
+			data = [{'value': self.Get(table, address + i, obj)} for i in range(length)]
+			return {'status': 0, 'data': data} if table == 'SP' else {'data': data}
+
+		if command in ('datapointReadListValue', 'setpointReadListValue'):
+			table = 'DP' if command.startswith('datapoint') else 'SP'
+			items = params['list']
+			self._CheckList(command, items)
+			data = [{'value': self.Get(table, i['address'], i['obj'])} for i in items]
+			return {'status': 0, 'data': data} if table == 'SP' else {'data': data}
+
+		if command == 'setpointWriteValue':
+			items = params['list']
+			self._CheckList(command, items)
+			for i in items:
+				address, obj = self._write_map.get((i['address'], i['obj']), (i['address'], i['obj']))
+				self.Set('SP', address, obj, i['value'])
+			return {'status': 0}
+
+		raise NabtoError('nabtoRpcInvoke', nabtoapi.NABTO_FAILED_WITH_JSON_MESSAGE, 'Unknown query %s' % command)
+
+	def _CheckList(self, command, items):
+		if self.max_list is not None and len(items) > self.max_list:
+			raise NabtoError('nabtoRpcInvoke', nabtoapi.NABTO_FAILED_WITH_JSON_MESSAGE,
+				'%s: list too long (%d > %d)' % (command, len(items), self.max_list))
@@ -0,0 +1,141 @@
+"""
+Helpers for collecting data from multiple Pichler units in single process
+"""
+
+import os
+import json
+import time
+import concurrent.futures
+
+def LoadConfig(path):
+	"""
+	Load fleet configuration file
+
+	Configuration is JSON file with list of devices, e.g.:
+
+		{
+			"cycle": 60,
+			"workers": 8,
+			"user": "default user",
+			"password": "default password",
+			"devices": [
+				{"id": "device-id-1", "prefix": "pkom4/house1/"},
+				{"id": "device-id-2", "prefix": "pkom4/house2/", "user": "other user", "password": "other password"}
+			]
+		}
+
+	Device `user`/`password` fall back to top level values and then to `PICHLER_USER`/`PICHLER_PASSWORD`
+	environment variables. Device `prefix` defaults to 'pkom4/<id>/'.
+
+	Parameters
+	----------
+	path : str
+		Path to configuration file
+
+	Returns
+	-------
+	dict
+		Configuration with normalized device entries
+	"""
+	with open(path, 'r') as file:
+		config = json.load(file)
+
+	user = config.get('user') or os.environ.get('PICHLER_USER')
+	passwd = config.get('password') or os.environ.get('PICHLER_PASSWORD')
+
+	devices = []
+	for d in config['devices']:
+		prefix = d.get('prefix') or ('pkom4/%s/' % d['id'])
+		if not prefix.endswith('/'):
+			prefix += '/'
+		devices.append({
+			'id': d['id'],
+			'user': d.get('user') or user,
+			'password': d.get('password') or passwd,
+			'prefix': prefix,
+		})
+
+	prefixes = [d['prefix'] for d in devices]
+	if len(set(prefixes)) != len(prefixes):
+		raise ValueError('Fleet configuration contains duplicate MQTT prefixes')
+
+	config['devices'] = devices
+	return config
+
+class DeviceScheduler:
+	"""
+	Runs a set of tasks (one per device) concurrently, each task when its deadline expires.
+
+	Task returns monotonic time of its next deadline (or None to run again after `cycle`).
+	Task that runs longer than `cycle` is reported as overrun
+	and it's not started again until it finishes (so slow device can't pile up requests).
+
+	Methods
+	-------
+	Run(tasks)
+		Run tasks forever
+	"""
+
+	def __init__(self, cycle=60, workers=8, log=print):
+		"""
+		Parameters
+		----------
+		cycle : float, optional
+			Default time (in seconds) between task runs, by default 60
+		workers : int, optional
+			Maximal number of tasks running at the same time, by default 8
+		log : callable, optional
+			Logging function, by default print
+		"""
+		self.cycle = cycle
+		self.executor = concurrent.futures.ThreadPoolExecutor(max_workers=workers, thread_name_prefix='collect')
+		self.log = log
+		self.overruns = 0
+
+	def Run(self, tasks):
+		"""Run tasks forever
+
+		Parameters
+		----------
+		tasks : dict
+			Callables keyed by name (used in log messages)
+		"""
+		deadlines = dict.fromkeys(tasks, time.monotonic())
+		running = {}
+		overrun = set()
+		while True:
+			now = time.monotonic()
+			for name, task in tasks.items():
+				if deadlines[name] > now:
+					continue
+				if name not in running:
+					running[name] = self.executor.submit(self._Run, name, task, deadlines[name])
+					# report overrun if task doesn't finish within cycle
+					deadlines[name] = now + self.cycle
+				elif name not in overrun:
+					overrun.add(name)
+					self.overruns += 1
+					self.log('%s: overrun (still running)' % name)
+
+			# wait till some task finishes or next deadline expires
+			pending = [deadlines[name] for name in tasks if name not in overrun]
+			timeout = max(0, min(pending) - time.monotonic()) if pending else None
+			if running:
+				concurrent.futures.wait(list(running.values()), timeout, concurrent.futures.FIRST_COMPLETED)
+			else:
+				time.sleep(timeout)
+
+			for name, future in list(running.items()):
+				if future.done():
+					del running[name]
+					overrun.discard(name)
+					deadlines[name] = future.result()
+
+	def _Run(self, name, task, deadline):
+		try:
+			r = task()
+			if r is not None:
+				return r
+		except Exception as e:
+			self.log('%s: %s' % (name, e))
+		return max(deadline + self.cycle, time.monotonic())
@@ -0,0 +1,278 @@
+"""
+Local time-series history of datapoint values
+
+Values are stored column-per-datapoint in fixed size rings (raw samples and min/max/mean rollups).
+Rings are backed by memory-mapped files (when directory is given) or by in-memory `array` buffers.
+"""
+
+import os
+import json
+import mmap
+import math
+from array import array
+
+NAN = float('nan')
+
+# rollup tiers: (bucket length in seconds, number of buckets kept)
+DEFAULT_ROLLUPS = [
+	(60, 7 * 24 * 60),			# 1 minute buckets for a week
+	(15 * 60, 90 * 24 * 4),		# 15 minute buckets for 90 days
+	(60 * 60, 2 * 365 * 24),	# 1 hour buckets for 2 years
+]
+
+# number of raw samples kept
+DEFAULT_RETENTION = 7 * 24 * 60
+
+class Ring:
+	"""
+	Fixed size ring of records stored column by column (column-major array of doubles).
+
+	First two doubles of buffer hold position of next record and number of records,
+	then each field has its own contiguous column of `capacity` doubles.
+	"""
+
+	def __init__(self, fields, capacity, path=None):
+		self.fields = fields
+		self.capacity = capacity
+		size = 2 + fields * capacity
+		self._file = None
+		self._map = None
+		if path:
+			exists = os.path.exists(path) and os.path.getsize(path) == size * 8
+			self._file = open(path, 'r+b' if exists else 'w+b')
+			if not exists:
+				self._file.truncate(size * 8)
+			self._map = mmap.mmap(self._file.fileno(), size * 8)
+			self.data = memoryview(self._map).cast('d')
+			if not exists:
+				self.data[0] = 0
+				self.data[1] = 0
+				self.data[2:] = array('d', [NAN]) * (size - 2)
+		else:
+			self.data = array('d', [0, 0]) + array('d', [NAN]) * (fields * capacity)
+
+	def Close(self):
+		if self._map is not None:
+			self.data.release()
+			self._map.flush()
+			self._map.close()
+			self._file.close()
+			self._map = None
+
+	@property
+	def head(self):
+		return int(self.data[0])
+
+	@property
+	def count(self):
+		return int(self.data[1])
+
+	def Slot(self, index):
+		"""Get slot of record by logical index (0 = oldest record)"""
+		return (self.head - self.count + index) % self.capacity
+
+	def Get(self, field, slot):
+		return self.data[2 + field * self.capacity + slot]
+
+	def Set(self, field, slot, value):
+		self.data[2 + field * self.capacity + slot] = value
+
+	def Append(self):
+		"""Allocate slot for new record (oldest record is dropped when ring is full)"""
+		slot = self.head
+		for field in range(self.fields):
+			self.Set(field, slot, NAN)
+		return slot
+
+	def Commit(self):
+		"""Make record allocated by `Append` visible"""
+		self.data[0] = (self.head + 1) % self.capacity
+		self.data[1] = min(self.count + 1, self.capacity)
+
+	def Find(self, t):
+		"""Get logical index of first record with time (field 0) >= t"""
+		lo, hi = 0, self.count
+		while lo < hi:
+			mid = (lo + hi) // 2
+			if self.Get(0, self.Slot(mid)) < t:
+				lo = mid + 1
+			else:
+				hi = mid
+		return lo
+
+class HistoryStore:
+	"""
+	Time-series history of datapoint values with precomputed rollups.
+
+	Methods
+	-------
+	Append(t, values)
+		Store sample
+
+	Query(name, start, end, resolution)
+		Get values of datapoint in time range
+
+	Close()
+		Flush and close backing files
+	"""
+
+	def __init__(self, columns, path=None, retention=DEFAULT_RETENTION, rollups=DEFAULT_ROLLUPS):
+		"""
+		Parameters
+		----------
+		columns : list
+			Names of stored datapoints
+		path : str, optional
+			Directory of backing files, by default None (history is kept in memory only)
+		retention : int, optional
+			Number of raw samples kept, by default `DEFAULT_RETENTION`
+		rollups : list, optional
+			List of (bucket length, bucket count) rollup tiers, by default `DEFAULT_ROLLUPS`
+		"""
+		self.columns = list(columns)
+		self.index = {name: i for i, name in enumerate(self.columns)}
+		self.rollups = sorted(rollups)
+
+		layout = {'version': 1, 'columns': self.columns, 'retention': retention, 'rollups': self.rollups}
+		if path:
+			os.makedirs(path, exist_ok=True)
+			meta = os.path.join(path, 'meta.json')
+			if os.path.exists(meta):
+				with open(meta, 'r') as file:
+					if json.load(file) != json.loads(json.dumps(layout)):
+						# layout changed, start from scratch
+						for name in os.listdir(path):
+							if name.endswith('.bin'):
+								os.remove(os.path.join(path, name))
+			with open(meta, 'w') as file:
+				json.dump(layout, file)
+
+		def File(name):
+			return os.path.join(path, name) if path else None
+
+		n = len(self.columns)
+		# raw samples: time, value per column
+		self.raw = Ring(1 + n, retention, File('raw.bin'))
+		# rollups: bucket start, (min, max, sum, count) per column
+		self.tiers = [(bucket, Ring(1 + 4 * n, count, File('rollup-%d.bin' % bucket))) for bucket, count in self.rollups]
+
+	def Close(self):
+		"""Flush and close backing files"""
+		self.raw.Close()
+		for _, ring in self.tiers:
+			ring.Close()
+
+	def Append(self, t, values):
+		"""Store sample and update rollups
+
+		Parameters
+		----------
+		t : float
+			Time of sample (seconds since epoch), samples must be appended in time order
+		values : dict
+			Values keyed by datapoint name (unknown names are ignored, missing ones are stored as NaN)
+		"""
+		items = [(self.index[name], float(value)) for name, value in values.items() if name in self.index]
+
+		ring = self.raw
+		slot = ring.Append()
+		ring.Set(0, slot, t)
+		for column, value in items:
+			ring.Set(1 + column, slot, value)
+		ring.Commit()
+
+		for bucket, ring in self.tiers:
+			start = t - t % bucket
+			last = ring.Slot(ring.count - 1) if ring.count else None
+			if last is None or ring.Get(0, last) != start:
+				last = ring.Append()
+				ring.Set(0, last, start)
+				for column in range(len(self.columns)):
+					ring.Set(4 + 4 * column, last, 0)
+				ring.Commit()
+			for column, value in items:
+				base = 1 + 4 * column
+				if ring.Get(base + 3, last) == 0:
+					ring.Set(base, last, value)
+					ring.Set(base + 1, last, value)
+					ring.Set(base + 2, last, value)
+				else:
+					ring.Set(base, last, min(ring.Get(base, last), value))
+					ring.Set(base + 1, last, max(ring.Get(base + 1, last), value))
+					ring.Set(base + 2, last, ring.Get(base + 2, last) + value)
+				ring.Set(base + 3, last, ring.Get(base + 3, last) + 1)
+
+	def Query(self, name, start, end, resolution=None, max_points=1000):
+		"""Get values of datapoint in time range
+
+		Data are taken from the coarsest tier that still satisfies requested resolution,
+		raw samples are used only if resolution is finer than the finest rollup
+		(tier that doesn't hold start of the range anymore is used only if no other tier does).
+		Source that didn't drop any data yet holds start of any range, if no source holds start of the range,
+		the source is chosen by resolution only.
+
+		Parameters
+		----------
+		name : str
+			Datapoint name
+		start : float
+			Start of time range (seconds since epoch, inclusive)
+		end : float
+			End of time range (seconds since epoch, exclusive)
+		resolution : float, optional
+			Requested time resolution in seconds, by default range length divided by `max_points`
+		max_points : int, optional
+			Used to compute default resolution, by default 1000
+
+		Returns
+		-------
+		list
+			List of (time, min, max, mean) tuples (min = max = mean for raw samples), samples without value are skipped
+		"""
+		column = self.index[name]
+		if resolution is None:
+			resolution = (end - start) / max_points
+
+		def Covers(ring):
+			# ring that didn't drop any record yet holds all data (even if range starts before the first one)
+			return ring.count and (ring.count < ring.capacity or ring.Get(0, ring.Slot(0)) <= start)
+
+		# coarsest tier with requested resolution that still holds start of range,
+		# raw samples if finer resolution is requested, otherwise finest tier that holds start of range;
+		# if nothing holds start of range, coarsest source that satisfies resolution (raw if finer than any tier)
+		fine = [tier for tier in self.tiers if tier[0] <= resolution and Covers(tier[1])]
+		covering = [tier for tier in self.tiers if Covers(tier[1])]
+		if fine:
+			tier = fine[-1]
+		elif not self.tiers or (resolution < self.tiers[0][0] and (Covers(self.raw) or not covering)):
+			tier = None
+		elif covering:
+			tier = covering[0]
+		else:
+			tier = [tier for tier in self.tiers if tier[0] <= resolution][-1]
+
+		if tier is None:
+			ring = self.raw
+			r = []
+			for i in range(ring.Find(start), ring.count):
+				slot = ring.Slot(i)
+				t = ring.Get(0, slot)
+				if t >= end:
+					break
+				value = ring.Get(1 + column, slot)
+				if not math.isnan(value):
+					r.append((t, value, value, value))
+			return r
+
+		bucket, ring = tier
+		base = 1 + 4 * column
+		r = []
+		for i in range(ring.Find(start - start % bucket), ring.count):
+			slot = ring.Slot(i)
+			t = ring.Get(0, slot)
+			if t >= end:
+				break
+			count = ring.Get(base + 3, slot)
+			if count:
+				r.append((t, ring.Get(base, slot), ring.Get(base + 1, slot), ring.Get(base + 2, slot) / count))
+		return r
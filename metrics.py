@@ -0,0 +1,268 @@
+"""
+Runtime metrics (counters, gauges, histograms) exported in Prometheus text format
+"""
+
+import bisect
+import threading
+import http.server
+
+# default histogram buckets of durations (seconds)
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+def _Format(value):
+	if value == float('inf'):
+		return '+Inf'
+	return repr(float(value)) if isinstance(value, float) else str(value)
+
+def _Labels(names, values, extra=()):
+	pairs = list(zip(names, values)) + list(extra)
+	if not pairs:
+		return ''
+	return '{%s}' % ','.join('%s="%s"' % (k, str(v).replace('\\', r'\\').replace('"', r'\"').replace('\n', r'\n')) for k, v in pairs)
+
+class Metric:
+	"""
+	Base of all metrics, values are kept per tuple of label values
+
+	Attributes
+	----------
+	name : str
+		Metric name
+	help : str
+		Description of metric
+	labels : tuple
+		Names of labels
+	"""
+
+	kind = 'untyped'
+
+	def __init__(self, name, help, labels=()):
+		self.name = name
+		self.help = help
+		self.labels = tuple(labels)
+		self._values = {}
+		self._lock = threading.Lock()
+
+	def Samples(self):
+		"""Get list of (name, label values, value) samples"""
+		with self._lock:
+			return [(self.name, labels, value) for labels, value in self._values.items()]
+
+	def Render(self):
+		"""Get metric in Prometheus text format"""
+		lines = ['# HELP %s %s' % (self.name, self.help), '# TYPE %s %s' % (self.name, self.kind)]
+		for name, labels, value in self.Samples():
+			extra = ()
+			if name.endswith('_bucket'):
+				labels, extra = labels[:-1], (('le', _Format(labels[-1])),)
+			lines.append('%s%s %s' % (name, _Labels(self.labels, labels, extra), _Format(value)))
+		return '\n'.join(lines) + '\n'
+
+class Counter(Metric):
+	"""
+	Monotonically increasing value
+
+	Methods
+	-------
+	Inc(*labels)
+		Increase counter by one
+
+	Add(value, *labels)
+		Increase counter by given value
+	"""
+
+	kind = 'counter'
+
+	def Inc(self, *labels):
+		with self._lock:
+			self._values[labels] = self._values.get(labels, 0) + 1
+
+	def Add(self, value, *labels):
+		with self._lock:
+			self._values[labels] = self._values.get(labels, 0) + value
+
+class Gauge(Metric):
+	"""
+	Value that can go up and down
+
+	Methods
+	-------
+	Set(value, *labels)
+		Set gauge value
+	"""
+
+	kind = 'gauge'
+
+	def Set(self, value, *labels):
+		with self._lock:
+			self._values[labels] = value
+
+class Histogram(Metric):
+	"""
+	Distribution of observed values in cumulative buckets
+
+	Methods
+	-------
+	Observe(value, *labels)
+		Record observed value
+	"""
+
+	kind = 'histogram'
+
+	def __init__(self, name, help, labels=(), buckets=DURATION_BUCKETS):
+		super().__init__(name, help, labels)
+		self.buckets = tuple(sorted(buckets))
+
+	def Observe(self, value, *labels):
+		i = bisect.bisect_left(self.buckets, value)
+		with self._lock:
+			h = self._values.get(labels)
+			if h is None:
+				# per bucket counts (last one is +Inf), sum, count
+				h = self._values[labels] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+			h[0][i] += 1
+			h[1] += value
+			h[2] += 1
+
+	def Samples(self):
+		r = []
+		with self._lock:
+			for labels, (counts, total, count) in self._values.items():
+				cumulative = 0
+				for le, n in zip(self.buckets + (float('inf'),), counts):
+					cumulative += n
+					r.append((self.name + '_bucket', labels + (le,), cumulative))
+				r.append((self.name + '_sum', labels, total))
+				r.append((self.name + '_count', labels, count))
+		return r
+
+class Callback(Metric):
+	"""
+	Metric which values are provided by function when metrics are collected
+	(for statistics already kept by other objects, e.g. `Publisher.sent`)
+	"""
+
+	def __init__(self, name, help, kind, labels, fn):
+		"""
+		Parameters
+		----------
+		name : str
+			Metric name
+		help : str
+			Description of metric
+		kind : str
+			'counter' or 'gauge'
+		labels : list
+			Names of labels
+		fn : callable
+			Function returning iterable of (label values, value) pairs
+		"""
+		super().__init__(name, help, labels)
+		self.kind = kind
+		self.fn = fn
+
+	def Samples(self):
+		return [(self.name, tuple(labels), value) for labels, value in self.fn()]
+
+class Registry:
+	"""
+	Set of metrics
+
+	Methods
+	-------
+	Counter(name, help, labels)
+		Create counter
+
+	Gauge(name, help, labels)
+		Create gauge
+
+	Histogram(name, help, labels, buckets)
+		Create histogram
+
+	Callback(name, help, kind, labels, fn)
+		Create metric with values provided by function
+
+	Samples()
+		Get samples of all metrics
+
+	Render()
+		Get all metrics in Prometheus text format
+	"""
+
+	def __init__(self):
+		self.metrics = {}
+		self._lock = threading.Lock()
+
+	def Register(self, metric):
+		"""Add metric to registry (metric with the same name is replaced)"""
+		with self._lock:
+			self.metrics[metric.name] = metric
+		return metric
+
+	def Counter(self, name, help, labels=()):
+		return self.Register(Counter(name, help, labels))
+
+	def Gauge(self, name, help, labels=()):
+		return self.Register(Gauge(name, help, labels))
+
+	def Histogram(self, name, help, labels=(), buckets=DURATION_BUCKETS):
+		return self.Register(Histogram(name, help, labels, buckets))
+
+	def Callback(self, name, help, kind, labels, fn):
+		return self.Register(Callback(name, help, kind, labels, fn))
+
+	def Samples(self):
+		"""Get list of (name, label names, label values, value) samples of all metrics"""
+		with self._lock:
+			metrics = list(self.metrics.values())
+		r = []
+		for metric in metrics:
+			for name, labels, value in metric.Samples():
+				r.append((name, metric.labels, labels, value))
+		return r
+
+	def Render(self):
+		"""Get all metrics in Prometheus text format"""
+		with self._lock:
+			metrics = list(self.metrics.values())
+		return ''.join(metric.Render() for metric in metrics)
+
+# default registry used by all modules
+REGISTRY = Registry()
+
+def Serve(port, host='', registry=REGISTRY):
+	"""Serve metrics over HTTP (`/metrics`) on background thread
+
+	Parameters
+	----------
+	port : int
+		TCP port
+	host : str, optional
+		Address to bind to, by default all interfaces
+	registry : Registry, optional
+		Served metrics, by default `REGISTRY`
+
+	Returns
+	-------
+	http.server.ThreadingHTTPServer
+		Running server (stop it by `shutdown()`)
+	"""
+	class Handler(http.server.BaseHTTPRequestHandler):
+		def do_GET(self):
+			if self.path.split('?')[0] not in ('/', '/metrics'):
+				self.send_error(404)
+				return
+			body = registry.Render().encode()
+			self.send_response(200)
+			self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+			self.send_header('Content-Length', str(len(body)))
+			self.end_headers()
+			self.wfile.write(body)
+
+		def log_message(self, format, *args):
+			pass
+
+	server = http.server.ThreadingHTTPServer((host, port), Handler)
+	server.daemon_threads = True
+	threading.Thread(target=server.serve_forever, daemon=True).start()
+	return server
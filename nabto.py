@@ -6,33 +6,50 @@ https://www.nabto.com/developer
 https://downloads.nabto.com/assets/docs/TEN025 Writing a Nabto API client application.pdf
 """
 
-import sys
 import os
-import json
-from ctypes import *
+import time
+import random
+import threading
+import metrics
+import nabtoapi
+from nabtoapi import NabtoError
+
+# statuses after which session is reopened
+SESSION_ERRORS = {nabtoapi.NABTO_INVALID_SESSION, nabtoapi.NABTO_NO_NETWORK}
+# number of empty responses in a row after which session is reopened
+EMPTY_LIMIT = 3
+# delay (in seconds) between failed reopens, doubled by every failure up to `REOPEN_MAX_BACKOFF`
+REOPEN_BACKOFF = 1.0
+REOPEN_MAX_BACKOFF = 60.0
+
+session_reopens = metrics.REGISTRY.Counter('pichler_session_reopens_total', 'Reopens of dead sessions', ['session', 'result'])
+session_recovery = metrics.REGISTRY.Histogram('pichler_session_recovery_seconds', 'Time from session failure to first response after reopen', ['session'])
 
 class Client:
 	"""
 	Simple wrapper for Nabto client library (currently only limited session/RPC functionality)
 	"""
 
-	def __init__(self, home):
-		if sys.platform == 'win32':
-			library = 'nabto_client_api.dll'
-		else:
-			library = 'libnabto_client_api.so'
-
-		package_dir = os.path.dirname(os.path.abspath(__file__))
-		self.client = cdll.LoadLibrary(os.path.join(package_dir, 'libs', library))
-
-		# NABTO_DECL_PREFIX nabto_status_t NABTOAPI nabtoStartup(const char* nabtoHomeDir);
-		self.client.nabtoStartup(home.encode())
-		self.client.nabtoInstallDefaultStaticResources(None)
-		self.client.nabtoSetOption(b'urlPortalHostName', b'lscontrol')
+	def __init__(self, home, library=None):
+		"""
+		Parameters
+		----------
+		home : str
+			Nabto home directory (profiles, certificates)
+		library : nabtoapi.Library, optional
+			Nabto library binding, by default library from `libs` folder is loaded
+			(or fake library when `NABTO_BACKEND=fake`, see `fakenabto`)
+		"""
+		if library is None and os.environ.get('NABTO_BACKEND') == 'fake':
+			import fakenabto
+			library = fakenabto.FakeLibrary.FromEnvironment()
+		self.api = library or nabtoapi.Library()
+		self.api.Startup(home)
+		self.api.InstallDefaultStaticResources()
+		self.api.SetOption('urlPortalHostName', 'lscontrol')
 
 	def __del__(self):
-		# NABTO_DECL_PREFIX nabto_status_t NABTOAPI nabtoShutdown(void);
-		self.client.nabtoShutdown()
+		self.api.Shutdown()
 
 	def GetLocalDevices(self):
 		"""
@@ -41,16 +58,9 @@ class Client:
 		Returns
 		-------
 		list
-			Found devices
+			IDs of all devices found on local network
 		"""
-		devices = pointer(c_char_p())
-		count = c_int(0)
-		# NABTO_DECL_PREFIX nabto_status_t NABTOAPI nabtoGetLocalDevices(char*** devices, int* numberOfDevices);
-		self.client.nabtoGetLocalDevices(pointer(devices), pointer(count))
-		if (count.value != 0):
-			return [devices.contents.value]
-
-		return []
+		return self.api.GetLocalDevices()
 
 	def CreateProfile(self, user, pwd):
 		"""
@@ -68,10 +78,13 @@ class Client:
 		int
 			Nabto status (0=success)
 		"""
-		# NABTO_DECL_PREFIX nabto_status_t NABTOAPI nabtoCreateProfile(const char* email, const char* password);
-		return self.client.nabtoCreateProfile(user.encode(), pwd.encode())
+		try:
+			self.api.CreateProfile(user, pwd)
+		except NabtoError as e:
+			return e.status
+		return nabtoapi.NABTO_OK
 
-	def OpenSession(self, user, pwd):
+	def OpenSession(self, user, pwd, name=''):
 		"""
 		Open session to device
 		
@@ -81,73 +94,207 @@ class Client:
 			User name of account associated with device
 		pwd : str
 			Password for given account
+		name : str, optional
+			Session name used as metrics label (e.g. device ID), by default ''
 		
 		Returns
 		-------
 		Client.Session
 			Session object
+
+		Raises
+		------
+		NabtoError
+			If session can't be opened
 		"""
-		return self.Session(self.client, user, pwd)
+		return self.Session(self.api, user, pwd, name)
 
 	class Session:
 		"""
 		A class that represents opened session
-		"""
-		def __init__(self, client, user, pwd):
-			self.client = client
 
-			session = c_void_p()
-			# NABTO_DECL_PREFIX nabto_status_t NABTOAPI nabtoOpenSession(nabto_handle_t* session, const char* id, const char* password);
-			status = self.client.nabtoOpenSession(pointer(session), user.encode(), pwd.encode())
-			if status == 5:
-				status = self.client.nabtoCreateProfile(user.encode(), pwd.encode())
-				if status != 0:
-					print('nabtoCreateProfile error (%d)' % status)
+		Session is considered dead after RPC fails with one of `SESSION_ERRORS`
+		or after `EMPTY_LIMIT` empty responses in a row. Dead session is reopened by next RPC
+		(by the same library runtime, with the same user and RPC interface) and the RPC is retried once.
+		Failed reopen is repeated after exponential backoff with jitter, RPCs fail right away until then.
 
-				session = c_void_p()
-				status = self.client.nabtoOpenSession(pointer(session), user.encode(), pwd.encode())
+		Attributes
+		----------
+		healthy : bool
+			False while session is dead (until it's reopened)
+		reopens : int
+			Number of successful reopens
+		recovery_time : float
+			Time (in seconds) from failure to first successful RPC after last recovery (None if there was none)
+		"""
+		def __init__(self, api, user, pwd, name=''):
+			self.api = api
+			self.user = user
+			self.pwd = pwd
+			self.name = name
+			self.session = None
+			self.interface = None
+			self.healthy = True
+			self.reopens = 0
+			self.recovery_time = None
+			self._closed = False
+			self._lock = threading.RLock()
+			self._empty = 0
+			self._attempts = 0
+			self._retry_at = 0.0
+			self._down_since = None
+			self._recovering = False
+			self._status = None
 
-			if status != 0:
-				print('nabtoOpenSession error (%d)' % status)
-			self.session = session
+			self.session = self._Open()
 
 		def __del__(self):
-			self.client.nabtoCloseSession(self.session)
+			self.Close()
+
+		def _Open(self):
+			try:
+				return self.api.OpenSession(self.user, self.pwd)
+			except NabtoError as e:
+				if e.status != nabtoapi.NABTO_OPEN_CERT_OR_PK_FAILED:
+					raise
+			# no profile for given user yet
+			self.api.CreateProfile(self.user, self.pwd)
+			return self.api.OpenSession(self.user, self.pwd)
+
+		def Close(self):
+			"""
+			Close session (session can't be used afterwards)
+			"""
+			with self._lock:
+				self._closed = True
+				if self.session is not None:
+					session, self.session = self.session, None
+					self.api.CloseSession(session)
 
 		def RpcSetDefaultInterface(self, interfaceDefinition):
 			"""
-			Assign RPC interface definition to session
+			Assign RPC interface definition to session (it's assigned again when session is reopened)
 			
 			Parameters
 			----------
 			interfaceDefinition : str
 				XML with RPC interface definition
+
+			Raises
+			------
+			NabtoError
+				If interface definition is invalid
 			"""
-			err = c_char_p()
-			# NABTO_DECL_PREFIX nabto_status_t NABTOAPI nabtoRpcSetDefaultInterface(nabto_handle_t session, const char* interfaceDefinition, char** errorMessage);
-			if self.client.nabtoRpcSetDefaultInterface(self.session, interfaceDefinition.encode(), pointer(err)) != 0:
-				print('nabtoRpcSetDefaultInterface error: %s' % err)
+			with self._lock:
+				self.api.RpcSetDefaultInterface(self._Acquire(), interfaceDefinition)
+				self.interface = interfaceDefinition
 
 		def RpcInvoke(self, nabtoUrl):
 			"""
-			Invoke RPC command
+			Invoke RPC command (dead session is reopened first)
 			
 			Parameters
 			----------
-			nabtoUrl : str
-				URL that contains RPC command along with command parameters
+			nabtoUrl : str, bytes
+				URL that contains RPC command along with command parameters (bytes are passed as they are)
 			
 			Returns
 			-------
 			dict
 				RPC response
+
+			Raises
+			------
+			NabtoError
+				If RPC fails (or session is dead and can't be reopened yet)
 			"""
-			out = c_char_p()
-			self.client.nabtoRpcInvoke(self.session, nabtoUrl.encode(), pointer(out))
+			if isinstance(nabtoUrl, str):
+				nabtoUrl = nabtoUrl.encode()
+			for attempt in (0, 1):
+				session = self._Acquire()
+				try:
+					r = self.api.RpcInvoke(session, nabtoUrl)
+				except NabtoError as e:
+					if e.status not in SESSION_ERRORS:
+						raise
+					self._Failed(session, e.status)
+					if attempt:
+						raise
+					continue
+				self._Checked(session, bool(r))
+				return r or []
+
+		def _Acquire(self):
+			"""Get handle of live session (reopen dead one)"""
+			with self._lock:
+				if self._closed:
+					raise NabtoError('nabtoRpcInvoke', nabtoapi.NABTO_INVALID_SESSION, 'Session is closed')
+				if not self.healthy:
+					self._Reopen()
+				return self.session
+
+		def _Reopen(self):
+			now = time.monotonic()
+			if now < self._retry_at:
+				raise NabtoError('nabtoOpenSession', self._status or nabtoapi.NABTO_INVALID_SESSION,
+					'Session is down, next reopen in %.1f s' % (self._retry_at - now))
+			if self.session is not None:
+				session, self.session = self.session, None
+				try:
+					self.api.CloseSession(session)
+				except NabtoError:
+					pass
+			try:
+				self.session = self._Open()
+				if self.interface is not None:
+					self.api.RpcSetDefaultInterface(self.session, self.interface)
+			except NabtoError as e:
+				self._status = e.status
+				self._Backoff()
+				session_reopens.Inc(self.name, 'failed')
+				raise
+			self.healthy = True
+			self.reopens += 1
+			self._empty = 0
+			self._recovering = True
+			session_reopens.Inc(self.name, 'ok')
+
+		def _Failed(self, session, status):
+			with self._lock:
+				# other thread may have reopened the session already
+				if session is not self.session or not self.healthy:
+					return
+				self.healthy = False
+				self._status = status
+				if self._recovering:
+					# reopened session failed too
+					self._Backoff()
+				else:
+					self._retry_at = 0.0
+				if self._down_since is None:
+					self._down_since = time.monotonic()
 
-			if out:
-				response = out.value
-				self.client.nabtoFree(out)
-				return json.loads(response)
+		def _Backoff(self):
+			# exponential backoff with "equal" jitter (half of delay is random)
+			delay = min(REOPEN_MAX_BACKOFF, REOPEN_BACKOFF * 2 ** self._attempts)
+			self._attempts += 1
+			self._retry_at = time.monotonic() + delay / 2 + random.uniform(0, delay / 2)
 
-			return []
+		def _Checked(self, session, response):
+			"""Track empty responses, measure recovery time at first response after reopen"""
+			if not response:
+				with self._lock:
+					self._empty += 1
+					if self._empty >= EMPTY_LIMIT:
+						self._Failed(session, None)
+				return
+			if self._empty or self._recovering:
+				with self._lock:
+					self._empty = 0
+					if self._recovering:
+						if self._down_since is not None:
+							self.recovery_time = time.monotonic() - self._down_since
+							session_recovery.Observe(self.recovery_time, self.name)
+						self._recovering = False
+						self._down_since = None
+						self._attempts = 0
@@ -0,0 +1,255 @@
+"""
+Typed ctypes binding of Nabto client library (nabto_client_api.h)
+
+All used functions have declared prototypes, failed calls raise `NabtoError`.
+"""
+
+import sys
+import os
+import json
+import ctypes
+import threading
+from ctypes import c_int, c_char_p, c_void_p, POINTER, byref
+
+# nabto_status_t values
+STATUS_NAMES = [
+	'NABTO_OK',
+	'NABTO_NO_PROFILE',
+	'NABTO_ERROR_READING_CONFIG',
+	'NABTO_API_NOT_INITIALIZED',
+	'NABTO_INVALID_SESSION',
+	'NABTO_OPEN_CERT_OR_PK_FAILED',
+	'NABTO_UNLOCK_PK_FAILED',
+	'NABTO_PORTAL_LOGIN_FAILURE',
+	'NABTO_CERT_SIGNING_ERROR',
+	'NABTO_CERT_SAVING_FAILURE',
+	'NABTO_ADDRESS_IN_USE',
+	'NABTO_INVALID_ADDRESS',
+	'NABTO_NO_NETWORK',
+	'NABTO_CONNECT_TO_HOST_FAILED',
+	'NABTO_STREAMING_UNSUPPORTED',
+	'NABTO_INVALID_STREAM',
+	'NABTO_DATA_PENDING',
+	'NABTO_BUFFER_FULL',
+	'NABTO_FAILED',
+	'NABTO_INVALID_TUNNEL',
+	'NABTO_ILLEGAL_PARAMETER',
+	'NABTO_INVALID_RESOURCE',
+	'NABTO_INVALID_STREAM_OPTION',
+	'NABTO_INVALID_STREAM_OPTION_ARGUMENT',
+	'NABTO_ABORTED',
+	'NABTO_STREAM_CLOSED',
+	'NABTO_FAILED_WITH_JSON_MESSAGE',
+	'NABTO_RESOURCE_EXISTS',
+	'NABTO_NOT_SUPPORTED',
+]
+
+NABTO_OK = 0
+NABTO_API_NOT_INITIALIZED = 3
+NABTO_INVALID_SESSION = 4
+NABTO_OPEN_CERT_OR_PK_FAILED = 5
+NABTO_NO_NETWORK = 12
+NABTO_CONNECT_TO_HOST_FAILED = 13
+NABTO_FAILED = 18
+NABTO_FAILED_WITH_JSON_MESSAGE = 26
+NABTO_RESOURCE_EXISTS = 27
+
+class NabtoError(Exception):
+	"""
+	Error returned by Nabto client library
+
+	Attributes
+	----------
+	function : str
+		Name of failed library function
+	status : int
+		Nabto status code
+	message : str
+		Error message (if provided by library)
+	"""
+
+	def __init__(self, function, status, message=None):
+		self.function = function
+		self.status = status
+		self.message = message
+		text = '%s failed: %s (%d)' % (function, StatusName(status), status)
+		if message:
+			text += ': ' + message
+		super().__init__(text)
+
+def StatusName(status):
+	"""Get name of Nabto status code"""
+	if 0 <= status < len(STATUS_NAMES):
+		return STATUS_NAMES[status]
+	return 'NABTO_UNKNOWN_STATUS'
+
+# str from UTF-8 C string (char*) in one copy (private prototype, `ctypes.pythonapi` function is shared)
+_FromString = ctypes.PYFUNCTYPE(ctypes.py_object, c_void_p)(('PyUnicode_FromString', ctypes.pythonapi))
+
+def _CheckStatus(status, func, args):
+	if status != NABTO_OK:
+		raise NabtoError(func.__name__, status)
+	return status
+
+class Library:
+	"""
+	Nabto client library with declared function prototypes
+
+	Methods mirror library functions (without `nabto` prefix), handles are passed as `c_void_p`.
+	"""
+
+	# function name: (argument types, check status)
+	PROTOTYPES = {
+		# nabto_status_t nabtoStartup(const char* nabtoHomeDir);
+		'nabtoStartup': ([c_char_p], True),
+		# nabto_status_t nabtoShutdown(void);
+		'nabtoShutdown': ([], False),
+		# nabto_status_t nabtoInstallDefaultStaticResources(const char* resourceDir);
+		'nabtoInstallDefaultStaticResources': ([c_char_p], False),
+		# nabto_status_t nabtoSetOption(const char* name, const char* value);
+		'nabtoSetOption': ([c_char_p, c_char_p], True),
+		# nabto_status_t nabtoGetLocalDevices(char*** devices, int* numberOfDevices);
+		# (array is returned to the same per-thread output as strings, see `Library._Output`)
+		'nabtoGetLocalDevices': ([POINTER(c_void_p), POINTER(c_int)], True),
+		# nabto_status_t nabtoCreateProfile(const char* email, const char* password);
+		'nabtoCreateProfile': ([c_char_p, c_char_p], True),
+		# nabto_status_t nabtoOpenSession(nabto_handle_t* session, const char* id, const char* password);
+		'nabtoOpenSession': ([POINTER(c_void_p), c_char_p, c_char_p], True),
+		# nabto_status_t nabtoCloseSession(nabto_handle_t session);
+		'nabtoCloseSession': ([c_void_p], False),
+		# nabto_status_t nabtoRpcSetDefaultInterface(nabto_handle_t session, const char* interfaceDefinition, char** errorMessage);
+		'nabtoRpcSetDefaultInterface': ([c_void_p, c_char_p, POINTER(c_void_p)], False),
+		# nabto_status_t nabtoRpcInvoke(nabto_handle_t session, const char* nabtoUrl, char** jsonResponse);
+		'nabtoRpcInvoke': ([c_void_p, c_char_p, POINTER(c_void_p)], False),
+		# nabto_status_t nabtoFree(void* p);
+		'nabtoFree': ([c_void_p], False),
+	}
+
+	def __init__(self, path=None):
+		"""
+		Parameters
+		----------
+		path : str, optional
+			Path to library, by default library from `libs` folder
+		"""
+		if path is None:
+			library = 'nabto_client_api.dll' if sys.platform == 'win32' else 'libnabto_client_api.so'
+			path = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'libs', library)
+
+		self.lib = ctypes.CDLL(path)
+		for name, (argtypes, check) in self.PROTOTYPES.items():
+			func = getattr(self.lib, name)
+			func.argtypes = argtypes
+			func.restype = c_int
+			if check:
+				func.errcheck = _CheckStatus
+
+		# RPC hot path: separate function pointers without argument conversion
+		# (callers pass session handle, URL bytes and per-thread output that are ctypes compatible already)
+		self._rpcInvoke = self.lib['nabtoRpcInvoke']
+		self._rpcInvoke.restype = c_int
+		self._free = self.lib['nabtoFree']
+		self._free.restype = c_int
+		# output (char*) reused by all calls of a thread (session pool, AsyncPichler call from several threads)
+		self._outputs = threading.local()
+
+	def _Output(self):
+		"""Get (output, byref(output)) of current thread, output is reset to NULL"""
+		try:
+			out, ref = self._outputs.out
+		except AttributeError:
+			out = c_void_p()
+			ref = byref(out)
+			self._outputs.out = (out, ref)
+		out.value = None
+		return out, ref
+
+	def Startup(self, home):
+		self.lib.nabtoStartup(home.encode())
+
+	def Shutdown(self):
+		self.lib.nabtoShutdown()
+
+	def InstallDefaultStaticResources(self):
+		status = self.lib.nabtoInstallDefaultStaticResources(None)
+		if status not in (NABTO_OK, NABTO_RESOURCE_EXISTS):
+			raise NabtoError('nabtoInstallDefaultStaticResources', status)
+
+	def SetOption(self, name, value):
+		self.lib.nabtoSetOption(name.encode(), value.encode())
+
+	def GetLocalDevices(self):
+		out, ref = self._Output()
+		count = c_int(0)
+		self.lib.nabtoGetLocalDevices(ref, byref(count))
+		if not out:
+			return []
+		# names and the array are allocated by library (discovery runs periodically, so free them)
+		array = ctypes.cast(out, POINTER(c_void_p))
+		pointers = [array[i] for i in range(count.value)]
+		try:
+			return [ctypes.string_at(p).decode() for p in pointers if p]
+		finally:
+			# `_free` has no argument conversion, addresses are passed as pointers explicitly
+			for p in pointers:
+				if p:
+					self._free(c_void_p(p))
+			self._free(out)
+
+	def CreateProfile(self, user, pwd):
+		self.lib.nabtoCreateProfile(user.encode(), pwd.encode())
+
+	def OpenSession(self, user, pwd):
+		session = c_void_p()
+		self.lib.nabtoOpenSession(byref(session), user.encode(), pwd.encode())
+		return session
+
+	def CloseSession(self, session):
+		self.lib.nabtoCloseSession(session)
+
+	def RpcSetDefaultInterface(self, session, interfaceDefinition):
+		out, ref = self._Output()
+		status = self.lib.nabtoRpcSetDefaultInterface(session, interfaceDefinition.encode(), ref)
+		message = self._Take(out)
+		if status != NABTO_OK:
+			raise NabtoError('nabtoRpcSetDefaultInterface', status, message)
+
+	def RpcInvoke(self, session, nabtoUrl):
+		"""Invoke RPC and parse JSON response
+
+		Parameters
+		----------
+		session : c_void_p
+			Session handle (as returned by `OpenSession`)
+		nabtoUrl : bytes
+			Encoded URL (must be bytes, arguments of this call aren't converted)
+
+		Returns
+		-------
+		dict
+			Parsed response
+		"""
+		out, ref = self._Output()
+		status = self._rpcInvoke(session, nabtoUrl, ref)
+		text = self._Take(out)
+		if status != NABTO_OK:
+			message = text
+			if status == NABTO_FAILED_WITH_JSON_MESSAGE and text:
+				try:
+					error = json.loads(text)['error']
+					message = error.get('detail') or error.get('body') or message
+				except (ValueError, KeyError, TypeError, AttributeError):
+					pass
+			raise NabtoError('nabtoRpcInvoke', status, message)
+		return json.loads(text) if text else None
+
+	def _Take(self, out):
+		"""Copy string allocated by library to str (decoded straight from C string, no intermediate bytes) and free it"""
+		if not out:
+			return None
+		try:
+			return _FromString(out)
+		except UnicodeDecodeError:
+			return ctypes.string_at(out).decode(errors='replace')
+		finally:
+			self._free(out)
@@ -0,0 +1,123 @@
+"""
+Bulk MQTT payloads (all values of collect cycle in one message)
+
+Two formats are supported:
+* JSON - `{"version": 1, "time": <seconds since epoch>, "values": {<topic>: <value>, ...}}`
+* binary frame - header (magic, format version, schema ID, time, entry count) followed by (topic index, value) entries,
+  topic indices refer to `Schema` (list of topics, published as JSON), schema ID is CRC32 of the topic list
+
+Topics are relative to device prefix (e.g. 'co2', 'status/heating').
+"""
+
+import json
+import struct
+import zlib
+
+# format version of both payloads
+VERSION = 1
+
+# binary frame: header (magic, version, schema ID, time, count), then count of (topic index, value) entries
+MAGIC = b'PK'
+HEADER = struct.Struct('<2sBIdH')
+ENTRY = struct.Struct('<Hd')
+
+class Schema:
+	"""
+	Topics of binary frame entries
+
+	Attributes
+	----------
+	topics : list
+		Topics, entry refers to topic by its index
+	id : int
+		Schema ID (CRC32 of topics), frames carry it so consumers can detect schema changes
+
+	Methods
+	-------
+	Encode(t, values)
+		Encode values to binary frame
+
+	Decode(frame)
+		Decode binary frame
+
+	Json()
+		Get schema description (for consumers)
+	"""
+
+	def __init__(self, topics):
+		"""
+		Parameters
+		----------
+		topics : list
+			Topics of all values that can be sent (duplicates are ignored)
+		"""
+		self.topics = list(dict.fromkeys(topics))
+		self.id = zlib.crc32('\n'.join(self.topics).encode())
+		self._index = {topic: i for i, topic in enumerate(self.topics)}
+
+	def Encode(self, t, values):
+		"""Encode values to binary frame
+
+		Parameters
+		----------
+		t : float
+			Time of values (seconds since epoch)
+		values : list
+			List of (topic, value) pairs (values of topics not in schema are left out)
+
+		Returns
+		-------
+		bytes
+			Binary frame
+		"""
+		index = self._index
+		entries = [(index[topic], value) for topic, value in values if topic in index]
+		frame = bytearray(HEADER.size + ENTRY.size * len(entries))
+		HEADER.pack_into(frame, 0, MAGIC, VERSION, self.id, t, len(entries))
+		offset = HEADER.size
+		for i, value in entries:
+			ENTRY.pack_into(frame, offset, i, value)
+			offset += ENTRY.size
+		return bytes(frame)
+
+	def Decode(self, frame):
+		"""Decode binary frame
+
+		Returns
+		-------
+		tuple
+			(time, values) where values is list of (topic, value) pairs
+
+		Raises
+		------
+		ValueError
+			If frame has unsupported version or was encoded by different schema
+		"""
+		magic, version, schema, t, count = HEADER.unpack_from(frame)
+		if magic != MAGIC or version != VERSION:
+			raise ValueError('Unsupported frame (version %d)' % version)
+		if schema != self.id:
+			raise ValueError('Frame of different schema (%08x)' % schema)
+		data = frame[HEADER.size:HEADER.size + count * ENTRY.size]
+		return t, [(self.topics[i], value) for i, value in ENTRY.iter_unpack(data)]
+
+	def Json(self):
+		"""Get schema description: `{"version": 1, "id": <schema ID>, "topics": [...]}`"""
+		return json.dumps({'version': VERSION, 'id': self.id, 'topics': self.topics})
+
+def EncodeJson(t, values):
+	"""Encode values to JSON payload
+
+	Parameters
+	----------
+	t : float
+		Time of values (seconds since epoch)
+	values : list
+		List of (topic, value) pairs
+
+	Returns
+	-------
+	str
+		JSON payload
+	"""
+	return json.dumps({'version': VERSION, 'time': t, 'values': dict(values)}, separators=(',', ':'))
@@ -5,9 +5,74 @@ Module for accessing Pichler heat pump unit
 import sys
 import os
 import nabto
+import metrics
+import readplan
+import registers
+import worker as device_worker
 import json
+import threading
+import time
+import types
+import concurrent.futures
 from collections import namedtuple
 
+# RPC instrumentation (see `metrics` module)
+rpc_duration = metrics.REGISTRY.Histogram('pichler_rpc_duration_seconds', 'Duration of device RPCs', ['device', 'command'])
+rpc_errors = metrics.REGISTRY.Counter('pichler_rpc_errors_total', 'Failed device RPCs', ['device', 'command'])
+rpc_empty = metrics.REGISTRY.Counter('pichler_rpc_empty_total', 'Device RPCs with empty response', ['device', 'command'])
+rpc_request_bytes = metrics.REGISTRY.Counter('pichler_rpc_request_bytes_total', 'Size of RPC requests (URL length)', ['device', 'command'])
+rpc_response_values = metrics.REGISTRY.Counter('pichler_rpc_response_values_total', 'Number of values returned by device RPCs', ['device', 'command'])
+route_latency = metrics.REGISTRY.Gauge('pichler_route_latency_seconds', 'Ping latency of paths to device at last probe', ['device', 'host'])
+route_changes = metrics.REGISTRY.Counter('pichler_route_changes_total', 'Switches between local and remote path to device', ['device'])
+read_retries = metrics.REGISTRY.Counter('pichler_read_retries_total', 'Items requested again after missing, invalid or failed read', ['device'])
+
+# query used to probe paths to device
+PING_QUERY = b'ping.json?ping=1885957735'
+# pings per path and probe (first one includes connection setup)
+ROUTE_PROBES = 2
+
+# retries of items missing in batched read (only missing items are requested again)
+READ_RETRIES = 2
+# delay before first retry (in seconds), doubled by every next retry
+READ_BACKOFF = 0.5
+
+# status of item in batched read (see `PreparedRead.ReadPartial`)
+ITEM_OK = 'ok'
+ITEM_MISSING = 'missing'		# response was shorter than request
+ITEM_INVALID = 'invalid'		# value isn't 16-bit integer
+ITEM_ERROR = 'error'			# request failed
+
+# result of batched read
+#   values - real values of items that were read keyed by name
+#   status - status of all items keyed by name (`ITEM_OK`, ...)
+#   error  - last exception raised by request (None if all requests succeeded)
+PartialRead = namedtuple('PartialRead', ['values', 'status', 'error'])
+
+def _IsRaw(value):
+	return type(value) is int and -0x8000 <= value <= 0xFFFF
+
+def _TryCall(call):
+	try:
+		return call[0](*call[1]), None
+	except Exception as e:
+		return None, e
+
+def _ListQuery(command, addrs):
+	request = {'request': {'list': [{'address': i[0], 'obj': i[1]} for i in addrs]}}
+	return ('%s.json?json=%s' % (command, json.dumps(request))).encode()
+
+def _DatapointItems(table, item):
+	return {name: item((table.address[i], table.obj[i]), table.scale[i]) for i, name in enumerate(table.names)}
+
+def _SetpointItems(table, item):
+	def Number(x):
+		return int(x) if x.is_integer() else x
+	return {name: item(
+		(table.address[i], table.obj[i]),
+		(table.write_address[i], table.write_obj[i]) if table.write_address[i] >= 0 else None,
+		(Number(table.low[i]), Number(table.high[i])),
+		table.scale[i]) for i, name in enumerate(table.names)}
+
 class Pichler:
 	"""
 	A class for accessing Pichler heat pump unit.
@@ -27,65 +92,40 @@ class Pichler:
 
 	GetSetpoints(sps)
 		Get values of multiple setpoints
+
+	Poll(names)
+		Get values of multiple datapoints and setpoints in (at most) two RPCs
+
+	Prepare(names)
+		Prepare repeated read of multiple datapoints and setpoints
+
+	Snapshot()
+		Get values of all datapoints and setpoints
+
+	SelectRoute()
+		Probe local and remote path to unit and switch to the faster one
+
+	Map(func, items)
+		Call function for each item concurrently on session pool
+
+	ListChunks(items)
+		Split items of list read to requests
 	"""
-	# datapoint definitions
+	# datapoint definitions (see `registers.json`)
 	DPItem = namedtuple('DPItem', ['addr', 'scale'])
-	DP = {
-		'StatusBits': DPItem((152, 1), 1),
-		'Malfunction': DPItem((34, 0), 1),
-		'CO2': DPItem((153, 1), 1),
-		'Humidity': DPItem((154, 1), 1),
-		'SCOP': DPItem((44, 0), 0.01),
-		'HP.COP': DPItem((45, 0), 0.01),
-		'HP.HeatingPower': DPItem((37, 0), 1),
-
-		'Energy.Total': DPItem((65, 0), 1),
-		'Energy.Heating': DPItem((64, 0), 1),
-		'Energy.Cooling': DPItem((27, 0), 1),
-		'Energy.HotWater': DPItem((38, 0), 1),
-		'Energy.Ventilation': DPItem((29, 0), 1),
-
-		'Power.HeatPump': DPItem((25, 0), 0.1),
-		'Power.HotWater': DPItem((24, 0), 0.1),
-		'Power.Ventilation': DPItem((26, 0), 0.1),
-
-		'Temperature.Room': DPItem((19, 0), 0.01),
-
-		'Temperature.Air.Supply': DPItem((1, 1), 0.01),
-		'Temperature.Air.Extract': DPItem((6, 1), 0.01),
-		'Temperature.Air.Outdoor': DPItem((2, 1), 0.01),
-		'Temperature.Air.Exhaust': DPItem((3, 1), 0.01),
-
-		'Temperature.Water.Center': DPItem((12, 1), 0.01),
-		'Temperature.Water.Bottom': DPItem((13, 1), 0.01),
-
-		'Ventilation.Level': DPItem((41, 1), 1),
-		'Ventilation.Supply': DPItem((22, 0), 0.1),
-		'Ventilation.Extract': DPItem((23, 0), 0.1),
-	}
+	DP = _DatapointItems(registers.REGISTERS.datapoints, DPItem)
 
+	# setpoint definitions (see `registers.json`)
 	SPItem = namedtuple('SPItem', ['addr_r', 'addr_w', 'limits', 'scale'])
-	SP = {
-		'CO2.Avail': SPItem((16, 0), (42, 0), (0, 3), 1),
-		'FilterChange': SPItem((18, 2), (652, 0), (0, 65535), 1.0/12),
-		'EquipmentType': SPItem((5, 0), (20, 0), (0, 1), 1),
-		'HotWater.E.Heating': SPItem((136, 0), (282, 0), (0, 1), 1),			# 0=off, 1=on
-		'HotWater.Fast.Heating': SPItem((106, 0), (222, 0), (0, 1), 1),			# 0=off, 1=on
-		'HotWater.Temperature': SPItem((129, 0), (268, 0), (20, 75), 0.01),
-		'KWH.COP.Reset.Day': SPItem((15, 2), (646, 0), (0, 65535), 1),
-		'KWH.COP.Reset.Month': SPItem((16, 2), (648, 0), (0, 65535), 1),
-		'KWH.COP.Reset.Year': SPItem((17, 2), (650, 0), (0, 65535), 1),
-		'OperatingMode.Holiday.Day': SPItem((2, 6), (936, 0), (0, 59), 1),
-		'OperatingMode.Holiday.Month': SPItem((1, 6), (934, 0), (0, 23), 1),
-		'OperatingMode.Holiday.Year': SPItem((0, 6), (932, 0), (0, 99), 1),
-		'OperatingMode': SPItem((0, 0), (10, 0), (0, 9), 1),					# 0=off, 1=summer, 2=winter, 3=auto
-		'Temperature.Normal': SPItem((10, 0), (30, 0), (10, 30), 0.01),
-		'Temperature.ActiveCooling': SPItem((19, 0), (48, 0), (15, 40), 0.01),
-		'ActiveCooling.Mode': SPItem((9, 0), (28, 0), (0, 2), 1),				# 0=off, 1=on, 2=eco
-		'Ventilation.Level': SPItem((46, 0), (102, 0), (0, 4), 1),				# 0=auto, 1=level1, 2=level2, 3=level3, 4=level4
-	}
-
-	def __init__(self, device=None, user=None, passwd=None):
+	SP = _SetpointItems(registers.REGISTERS.setpoints, SPItem)
+
+	# commands that run before pending reads when RPCs go through worker
+	WRITE_COMMANDS = {'setpointWriteValue'}
+
+	# RPC interface definition (loaded once, shared by all instances)
+	_interface = None
+
+	def __init__(self, device=None, user=None, passwd=None, planner=None, client=None, cache=None, worker=None, route_interval=None, sessions=None):
 		"""
 		Initialize communication with Pichler unit.
 
@@ -99,6 +139,20 @@ class Pichler:
 			Name of account that should be used to access unit's data, by default None
 		passwd : str, optional
 			Password for given account, by default None
+		planner : readplan.ReadPlanner, optional
+			Planner used for batched reads, by default planner with `readplan.DEFAULT_COST`
+		client : nabto.Client, optional
+			Nabto client shared by multiple instances (see `Pichler.CreateClient`), by default new client is created
+		cache : cache.ReadCache, optional
+			Cache used by `GetDatapoint(s)`/`GetSetpoint(s)`, by default None (values are always read from device)
+		worker : worker.DeviceWorker, optional
+			Worker that runs all RPCs one by one (writes before reads), by default None (RPCs run on caller's thread)
+		route_interval : float, optional
+			Interval (in seconds) of path re-evaluation (see `Pichler.SelectRoute`), 0 disables local discovery
+			(remote relay is always used), by default `PICHLER_ROUTE_INTERVAL` environment variable or 300
+		sessions : int, optional
+			Number of additional sessions used to read large batches concurrently (see `Pichler.Map`),
+			by default `PICHLER_SESSIONS` environment variable or 1 (no concurrent reads)
 
 		If any of these parameters is not provided, value from environment variable is used instead.
 		"""
@@ -114,15 +168,166 @@ class Pichler:
 
 		if not '.' in device:
 			device += '.remote.lscontrol.dk'
+		if route_interval is None:
+			route_interval = float(os.environ.get('PICHLER_ROUTE_INTERVAL', '300'))
+		if sessions is None:
+			sessions = int(os.environ.get('PICHLER_SESSIONS', '1'))
 
 		self.device = device
-		self.client = nabto.Client(os.path.join(package_dir, '.home'))
-		self.session = self.client.OpenSession(user, passwd)
+		self._snapshot = None
+		# host used by RPCs (`device` or local host of the unit, see `SelectRoute`)
+		self.host = device
+		self._url = ('nabto://%s/' % device).encode()
+		self.route_interval = route_interval
+		# latency of paths at last probe keyed by host (None = unreachable)
+		self.routes = {}
+		self._route_deadline = 0.0
+		self.planner = planner or readplan.ReadPlanner()
+		self.cache = cache
+		self.worker = worker
+		self.client = client or self.CreateClient()
+		self.session = self.client.OpenSession(user, passwd, device)
+
+		if Pichler._interface is None:
+			with open(os.path.join(package_dir, 'unabto_queries.xml'), 'r') as file:
+				Pichler._interface = file.read()
+
+		self.session.RpcSetDefaultInterface(Pichler._interface)
+
+		# session pool: every pool thread owns one session (bound to thread by `_BindSession`),
+		# so at most `sessions` RPCs are in flight and they don't go through `worker`
+		self.sessions = []
+		self._local = threading.local()
+		self._pool = None
+		if sessions > 1:
+			for _ in range(sessions):
+				session = self.client.OpenSession(user, passwd, device)
+				session.RpcSetDefaultInterface(Pichler._interface)
+				self.sessions.append(session)
+			self._free_sessions = list(self.sessions)
+			self._pool = concurrent.futures.ThreadPoolExecutor(sessions, 'pichler-session', self._BindSession)
+
+		if self.route_interval:
+			self.SelectRoute()
+
+	@staticmethod
+	def CreateClient():
+		"""
+		Create Nabto client
+
+		Single client can be shared by multiple `Pichler` instances (one session per device).
+
+		Returns
+		-------
+		nabto.Client
+			Nabto client
+		"""
+		package_dir = os.path.dirname(os.path.abspath(__file__))
+		return nabto.Client(os.path.join(package_dir, '.home'))
+
+	def Close(self):
+		"""Close session(s) to device"""
+		if self._pool is not None:
+			self._pool.shutdown()
+			for session in self.sessions:
+				session.Close()
+		if self.worker is not None:
+			self.worker.Call(device_worker.WRITE, self.session.Close)
+		else:
+			self.session.Close()
+
+	def _BindSession(self):
+		self._local.session = self._free_sessions.pop()
+
+	def Map(self, func, items):
+		"""Call function for each item concurrently on session pool
+
+		RPCs invoked by the function use session of pool thread it runs on,
+		without pool (`sessions` <= 1) items are processed one by one.
+
+		Parameters
+		----------
+		func : callable
+			Function to call (e.g. read of one chunk)
+		items : iterable
+			Arguments of function calls
+
+		Returns
+		-------
+		list
+			Results of function calls in order of items (first error is raised)
+		"""
+		items = list(items)
+		if self._pool is None or len(items) < 2 or getattr(self._local, 'session', None) is not None:
+			return [func(i) for i in items]
+		return list(self._pool.map(func, items))
+
+	def ListChunks(self, items):
+		"""Split items of list read to requests (see `readplan.ReadPlanner.Chunks`)
+
+		Items are split by `max_list` of planner cost model (if set) and, with session pool,
+		evenly across sessions so that `Map` runs the requests concurrently.
+		"""
+		return self.planner.Chunks(items, len(self.sessions) if self._pool is not None else 1)
+
+	def LocalHosts(self):
+		"""Get hosts of the unit found on local network (by Nabto local discovery)"""
+		name = self.device.partition('.')[0]
+		try:
+			devices = self.client.GetLocalDevices()
+		except nabto.NabtoError:
+			return []
+		return [d for d in devices if d.partition('.')[0] == name and d != self.device]
+
+	def SelectRoute(self):
+		"""
+		Probe local and remote path to unit and switch to the faster one
+
+		Latency of each path (local hosts found by discovery, remote relay) is measured by `Ping`.
+		It's called every `route_interval` seconds and when RPC on current path fails.
+
+		Returns
+		-------
+		dict
+			Latency (in seconds) keyed by host (None if host is unreachable),
+			empty if no local host was found (remote relay is used without probing)
+		"""
+		if self.worker is not None and not self.worker.IsCurrent():
+			return self.worker.Call(device_worker.CurrentPriority(device_worker.READ), self.SelectRoute)
 
-		with open(os.path.join(package_dir, 'unabto_queries.xml'), 'r') as file:
-		    rpc_xml = file.read()
+		hosts = self.LocalHosts()
+		routes = {}
+		if hosts:
+			for host in hosts + [self.device]:
+				routes[host] = self._Probe(host)
+				if routes[host] is not None:
+					route_latency.Set(routes[host], self.device, host)
+		reachable = {host: latency for host, latency in routes.items() if latency is not None}
+		if reachable:
+			host = min(reachable, key=reachable.get)
+		else:
+			# no local host (use remote relay) or no path works (stay on current one)
+			host = self.host if routes else self.device
+		if host != self.host:
+			route_changes.Inc(self.device)
+			self.host = host
+			self._url = ('nabto://%s/' % host).encode()
+		self.routes = routes
+		self._route_deadline = time.monotonic() + self.route_interval
+		return routes
 
-		self.session.RpcSetDefaultInterface(rpc_xml)
+	def _Probe(self, host):
+		url = ('nabto://%s/' % host).encode() + PING_QUERY
+		best = None
+		for _ in range(ROUTE_PROBES):
+			start = time.perf_counter()
+			try:
+				self.session.RpcInvoke(url)
+			except nabto.NabtoError:
+				return None
+			latency = time.perf_counter() - start
+			best = latency if best is None else min(best, latency)
+		return best
 
 	def GetDatapoint(self, dp):
 		"""Get value of single datapoint
@@ -137,8 +342,9 @@ class Pichler:
 		int, float
 			Real value of datapoint (scaled appropriately)
 		"""
-		item = self.DP[dp]
-		return self.DatapointRawReadValue(item.addr[0], item.addr[1]) * item.scale
+		if self.cache:
+			return self.GetDatapoints([dp])[0]
+		return self._GetDatapoints([dp])[0]
 
 	def GetDatapoints(self, dps):
 		"""Get values of multiple datapoints
@@ -153,15 +359,16 @@ class Pichler:
 		list
 			Real values of given datapoints (same order as input list)
 		"""
-		l = []
-		for dp in dps:
-			item = self.DP[dp]
-			l.append([item.addr[0], item.addr[1]])
-		r = self.DatapointRawReadListValues(l)
-		for i in range(len(dps)):
-			item = self.DP[dps[i]]
-			r[i] = r[i] * item.scale
-		return r
+		if self.cache:
+			return self.cache.Get(['DP:' + dp for dp in dps],
+				lambda keys: dict(zip(keys, self._GetDatapoints([k[3:] for k in keys]))))
+		return self._GetDatapoints(dps)
+
+	def _GetDatapoints(self, dps):
+		table = registers.REGISTERS.datapoints
+		indices = table.Indices(dps)
+		r = self.RawReadPlanned('DP', [[table.address[i], table.obj[i]] for i in indices])
+		return table.Scale(indices, r)
 
 	def GetSetpoint(self, sp):
 		"""Get value of single setpoint
@@ -176,8 +383,9 @@ class Pichler:
 		int, float
 			Real value of setpoint (scaled appropriately)
 		"""
-		item = self.SP[sp]
-		return self.SetpointRawReadValue(item.addr_r[0], item.addr_r[1]) * item.scale
+		if self.cache:
+			return self.GetSetpoints([sp])[0]
+		return self._GetSetpoints([sp])[0]
 
 	def GetSetpoints(self, sps):
 		"""Get values of multiple setpoints
@@ -192,15 +400,101 @@ class Pichler:
 		list
 			Real values of given setpoints (same order as input list)
 		"""
-		l = []
-		for sp in sps:
-			item = self.SP[sp]
-			l.append([item.addr_r[0], item.addr_r[1]])
-		r = self.SetpointRawReadListValues(l)
-		for i in range(len(sps)):
-			item = self.SP[sps[i]]
-			r[i] = r[i] * item.scale
-		return r
+		if self.cache:
+			return self.cache.Get(['SP:' + sp for sp in sps],
+				lambda keys: dict(zip(keys, self._GetSetpoints([k[3:] for k in keys]))))
+		return self._GetSetpoints(sps)
+
+	def _GetSetpoints(self, sps):
+		table = registers.REGISTERS.setpoints
+		indices = table.Indices(sps)
+		r = self.RawReadPlanned('SP', [[table.address[i], table.obj[i]] for i in indices])
+		return table.Scale(indices, r)
+
+	def Resolve(self, name):
+		"""Resolve datapoint/setpoint name to its read address and scale
+
+		Plain names are looked up in `Pichler.DP` first and in `Pichler.SP` next.
+		Prefix name with 'DP:' or 'SP:' to select the table explicitly
+		(e.g. 'SP:Ventilation.Level', which exists in both tables).
+
+		Parameters
+		----------
+		name : str
+			Datapoint or setpoint name
+
+		Returns
+		-------
+		tuple
+			(kind, addr, scale) where kind is 'DP' or 'SP'
+		"""
+		kind, _, key = name.rpartition(':')
+		if kind not in ('', 'DP', 'SP'):
+			raise KeyError(name)
+		if kind != 'SP' and key in self.DP:
+			item = self.DP[key]
+			return ('DP', item.addr, item.scale)
+		if kind != 'DP' and key in self.SP:
+			item = self.SP[key]
+			return ('SP', item.addr_r, item.scale)
+		raise KeyError(name)
+
+	def Prepare(self, names):
+		"""Prepare repeated read of multiple datapoints and setpoints
+
+		Names are resolved, read plan is created and requests are encoded only once,
+		`PreparedRead.Read` then just invokes the RPCs and scales the values.
+
+		Parameters
+		----------
+		names : list
+			List of datapoint/setpoint names (see `Pichler.Resolve`)
+
+		Returns
+		-------
+		PreparedRead
+			Prepared read
+		"""
+		return PreparedRead(self, names)
+
+	def Snapshot(self):
+		"""Get values of all datapoints and setpoints
+
+		All datapoints and all setpoints are read in (at most) two RPCs.
+
+		Returns
+		-------
+		Snapshot
+			Immutable view of values of all items (see `Pichler.DP`, `Pichler.SP`)
+		"""
+		if self._snapshot is None:
+			self._snapshot = self.Prepare(list(self.DP) + ['SP:' + sp for sp in self.SP])
+		t = time.time()
+		values = self._snapshot.Read()
+		return Snapshot(t,
+			{dp: values[dp] for dp in self.DP},
+			{sp: values['SP:' + sp] for sp in self.SP})
+
+	def Poll(self, names, parallel=True):
+		"""Get values of multiple datapoints and setpoints
+
+		All datapoints are read with single `datapointReadListValue` request
+		and all setpoints with single `setpointReadListValue` request
+		(unless planner finds range reads cheaper, see `Pichler.RawReadPlanned`).
+
+		Parameters
+		----------
+		names : list
+			List of datapoint/setpoint names (see `Pichler.Resolve`)
+		parallel : bool, optional
+			Run datapoint and setpoint requests at the same time, by default True
+
+		Returns
+		-------
+		dict
+			Real values of given items keyed by name (as given in input list)
+		"""
+		return self.Prepare(names).Read(parallel)
 
 	def SetSetpoint(self, sp, value):
 		"""Set value to single setpoint
@@ -225,8 +519,14 @@ class Pichler:
 		l = []
 		for sp in sps:
 			item = self.SP[sp[0]]
+			if item.addr_w is None:
+				raise ValueError('Setpoint %s is read-only' % sp[0])
 			l.append([item.addr_w[0], item.addr_w[1], int(sp[1] / item.scale)])
-		self.SetpointRawWriteListValues(l)
+		try:
+			self.SetpointRawWriteListValues(l)
+		finally:
+			if self.cache:
+				self.cache.Invalidate(['SP:' + sp[0] for sp in sps])
 
 	def RpcInvoke(self, command, params):
 		"""
@@ -246,9 +546,65 @@ class Pichler:
 		dict
 			Response from device
 		"""
-		r = self.session.RpcInvoke('nabto://%s/%s.json?%s' % (self.device, command, params))
+		return self.RpcInvokeQuery(command, ('%s.json?%s' % (command, params)).encode())
+
+	def RpcInvokeQuery(self, command, query):
+		"""
+		Invoke RPC command to device using already encoded query
+
+		RPC runs on `worker` if it's set (caller waits for the result).
+
+		Parameters
+		----------
+		command : str
+			Command name
+		query : bytes
+			Encoded command and its parameters (part of URL after device name)
+
+		Returns
+		-------
+		dict
+			Response from device
+		"""
+		session = getattr(self._local, 'session', None)
+		if session is not None:
+			# pool thread (see `Map`)
+			return self._Invoke(command, query, session)
+		if self.worker is not None and not self.worker.IsCurrent():
+			priority = device_worker.CurrentPriority(device_worker.WRITE if command in self.WRITE_COMMANDS else device_worker.READ)
+			return self.worker.Call(priority, self.RpcInvokeQuery, command, query)
+
+		if self.route_interval and time.monotonic() >= self._route_deadline:
+			self.SelectRoute()
+		host = self.host
+		try:
+			return self._Invoke(command, query, self.session)
+		except nabto.NabtoError:
+			# path may be gone (e.g. LAN connection lost), retry once on the other path
+			if len(self.routes) < 2:
+				raise
+			self.SelectRoute()
+			if self.host == host:
+				raise
+			return self._Invoke(command, query, self.session)
+
+	def _Invoke(self, command, query, session):
+		url = self._url + query
+		start = time.perf_counter()
+		try:
+			r = session.RpcInvoke(url)
+		except Exception:
+			rpc_errors.Inc(self.device, command)
+			raise
+		finally:
+			rpc_duration.Observe(time.perf_counter() - start, self.device, command)
+		rpc_request_bytes.Add(len(url), self.device, command)
 		if r:
-			return r['response']
+			response = r['response']
+			if 'data' in response:
+				rpc_response_values.Add(len(response['data']), self.device, command)
+			return response
+		rpc_empty.Inc(self.device, command)
 		return []
 
 	def Ping(self):
@@ -324,6 +680,63 @@ class Pichler:
 			return [i['value'] for i in response['data']]
 		return []
 
+	def RawReadPlanned(self, kind, lst):
+		"""
+		Read raw values from multiple datapoints or setpoints according to read plan
+
+		Neighbouring addresses may be read by range requests, the rest is read by list request(s)
+		(see `readplan.ReadPlanner`). Requests run concurrently on session pool (see `Pichler.Map`).
+		Values missing in responses (or invalid ones) are requested again, up to `READ_RETRIES` times.
+
+		Parameters
+		----------
+		kind : str
+			'DP' for datapoints, 'SP' for setpoints
+		lst : list
+			List of [address, object] pairs to read
+
+		Returns
+		-------
+		list
+			Raw values for each pair in original order
+
+		Raises
+		------
+		Exception
+			Last request error (or RuntimeError) if some values couldn't be read
+		"""
+		if kind == 'DP':
+			read_range, read_list = self.DatapointRawReadValues, self.DatapointRawReadListValues
+		else:
+			read_range, read_list = self.SetpointRawReadValues, self.SetpointRawReadListValues
+
+		plan = self.planner.Plan(lst)
+		requests = [(read_range, r) for r in plan.ranges] + [(read_list, (c,)) for c in self.ListChunks(plan.items)]
+		addrs = set(tuple(i) for i in lst)
+		values = {}
+		error = None
+		for attempt in range(READ_RETRIES + 1):
+			for (read, args), (result, e) in zip(requests, self.Map(_TryCall, requests)):
+				error = e or error
+				if read is read_range:
+					address, obj, length = args
+					keys = [(address + i, obj) for i in range(length)]
+				else:
+					keys = args[0]
+				for key, value in zip(keys, result or []):
+					if _IsRaw(value):
+						values[tuple(key)] = value
+			missing = sorted(addrs.difference(values))
+			if not missing or attempt == READ_RETRIES:
+				break
+			read_retries.Add(len(missing), self.device)
+			time.sleep(READ_BACKOFF * 2 ** attempt)
+			requests = [(read_list, (c,)) for c in self.ListChunks(missing)]
+
+		if missing:
+			raise error or RuntimeError('%d of %d values not read' % (len(missing), len(addrs)))
+		return [values[tuple(i)] for i in lst]
+
 	def SetpointRawReadValues(self, address, obj, length):
 		"""
 		Read raw values from one or more (neighboring) setpoints
@@ -399,3 +812,234 @@ class Pichler:
 		l = [{'address': i[0], 'obj': i[1], 'value': i[2]} for i in lst]
 		request = {'request': {'list': l}}
 		self.RpcInvoke('setpointWriteValue', 'json=%s' % json.dumps(request))
+
+class Snapshot:
+	"""
+	Immutable view of values of all datapoints and setpoints (see `Pichler.Snapshot`)
+
+	Values are accessible by name as in `Pichler.Resolve` (e.g. `snapshot['CO2']`, `snapshot['SP:Ventilation.Level']`).
+
+	Attributes
+	----------
+	time : float
+		Time when values were read (seconds since epoch)
+	datapoints : mapping
+		Real values of datapoints keyed by name
+	setpoints : mapping
+		Real values of setpoints keyed by name
+	"""
+
+	__slots__ = ('_time', '_datapoints', '_setpoints')
+
+	def __init__(self, timestamp, datapoints, setpoints):
+		object.__setattr__(self, '_time', timestamp)
+		object.__setattr__(self, '_datapoints', types.MappingProxyType(dict(datapoints)))
+		object.__setattr__(self, '_setpoints', types.MappingProxyType(dict(setpoints)))
+
+	def __setattr__(self, name, value):
+		raise AttributeError('Snapshot is immutable')
+
+	@property
+	def time(self):
+		return self._time
+
+	@property
+	def datapoints(self):
+		return self._datapoints
+
+	@property
+	def setpoints(self):
+		return self._setpoints
+
+	def __getitem__(self, name):
+		kind, _, key = name.rpartition(':')
+		if kind not in ('', 'DP', 'SP'):
+			raise KeyError(name)
+		if kind != 'SP' and key in self._datapoints:
+			return self._datapoints[key]
+		if kind != 'DP' and key in self._setpoints:
+			return self._setpoints[key]
+		raise KeyError(name)
+
+	def __contains__(self, name):
+		try:
+			self[name]
+			return True
+		except KeyError:
+			return False
+
+	def __repr__(self):
+		return 'Snapshot(time=%r, datapoints=%r, setpoints=%r)' % (self._time, dict(self._datapoints), dict(self._setpoints))
+
+class PreparedRead:
+	"""
+	Repeated read of fixed set of datapoints/setpoints (see `Pichler.Prepare`)
+
+	Addresses, read plan, encoded requests and scales are computed once,
+	each `Read` only invokes the RPCs and scales values.
+	Items missing in responses (short/empty response, invalid value, failed request) are requested again
+	by list request(s) of just these items, up to `READ_RETRIES` times with exponential backoff.
+
+	Methods
+	-------
+	Read(parallel)
+		Read values of all items
+
+	ReadPartial(parallel, retries, backoff)
+		Read values of all items, items that couldn't be read are left out
+	"""
+
+	def __init__(self, device, names):
+		self.device = device
+		self.names = list(names)
+		tables = {'DP': registers.REGISTERS.datapoints, 'SP': registers.REGISTERS.setpoints}
+
+		# unique addresses per kind get position in raw value array,
+		# `indices` are table indices of values in raw value array (used to scale them in one pass)
+		positions = {'DP': {}, 'SP': {}}
+		self.indices = {'DP': [], 'SP': []}
+		# (name, kind, position) of each item
+		self.targets = []
+		for name in self.names:
+			kind, addr, _ = device.Resolve(name)
+			addr = tuple(addr)
+			if addr not in positions[kind]:
+				positions[kind][addr] = len(self.indices[kind])
+				self.indices[kind].append(tables[kind].index[name.rpartition(':')[2]])
+			self.targets.append((name, kind, positions[kind][addr]))
+		self.tables = tables
+		# (address, obj) of every position (used to request missing values again)
+		self.addrs = {kind: list(positions[kind]) for kind in positions}
+
+		# requests: (command, query, slots) where slots are positions of response values (-1 for values not needed)
+		self.requests = {'DP': [], 'SP': []}
+		for kind, prefix in (('DP', 'datapoint'), ('SP', 'setpoint')):
+			if not positions[kind]:
+				continue
+			plan = device.planner.Plan(list(positions[kind]))
+			for address, obj, length in plan.ranges:
+				command = prefix + 'ReadValue'
+				query = '%s.json?address=%d&obj=%d&length=%d' % (command, address, obj, length)
+				slots = [positions[kind].get((address + i, obj), -1) for i in range(length)]
+				self.requests[kind].append((command, query.encode(), slots))
+			self.requests[kind] += self._ListRequests(kind, [positions[kind][tuple(i)] for i in plan.items])
+
+	def _ListRequests(self, kind, slots):
+		command = ('datapoint' if kind == 'DP' else 'setpoint') + 'ReadListValue'
+		return [(command, _ListQuery(command, [self.addrs[kind][p] for p in chunk]), chunk)
+			for chunk in self.device.ListChunks(slots)]
+
+	def _Invoke(self, requests, parallel):
+		"""Invoke (kind, request) pairs, returns (response, error) of each one"""
+		device = self.device
+
+		def Invoke(r):
+			return _TryCall((device.RpcInvokeQuery, r[1][:2]))
+
+		if parallel and device.sessions:
+			return device.Map(Invoke, requests)
+
+		results = [None] * len(requests)
+
+		def Run(kind):
+			for n, r in enumerate(requests):
+				if r[0] == kind:
+					results[n] = Invoke(r)
+
+		thread = None
+		if parallel and len(set(r[0] for r in requests)) > 1:
+			thread = threading.Thread(target=Run, args=('SP',))
+			thread.start()
+		else:
+			Run('SP')
+		Run('DP')
+		if thread:
+			thread.join()
+		return results
+
+	def ReadPartial(self, parallel=True, retries=None, backoff=None):
+		"""Read values of all items, items that couldn't be read are left out
+
+		Parameters
+		----------
+		parallel : bool, optional
+			Run requests at the same time (all of them on session pool, see `Pichler.Map`,
+			or datapoint and setpoint requests in two threads), by default True
+		retries : int, optional
+			Number of retries of missing items, by default `READ_RETRIES`
+		backoff : float, optional
+			Delay before first retry (in seconds, doubled by every next retry), by default `READ_BACKOFF`
+
+		Returns
+		-------
+		PartialRead
+			Values of items that were read, status of all items and last request error
+		"""
+		retries = READ_RETRIES if retries is None else retries
+		backoff = READ_BACKOFF if backoff is None else backoff
+		raw = {kind: [0] * len(indices) for kind, indices in self.indices.items()}
+		status = {kind: [ITEM_MISSING] * len(indices) for kind, indices in self.indices.items()}
+		requests = [(kind, request) for kind in ('SP', 'DP') for request in self.requests[kind]]
+		error = None
+
+		for attempt in range(retries + 1):
+			for (kind, (_, _, slots)), (response, e) in zip(requests, self._Invoke(requests, parallel)):
+				error = e or error
+				try:
+					data = response['data'] if response else []
+				except (KeyError, TypeError):
+					data = []
+				values, states = raw[kind], status[kind]
+				for i, position in enumerate(slots):
+					if position < 0 or states[position] == ITEM_OK:
+						continue
+					if i < len(data):
+						value = data[i].get('value') if isinstance(data[i], dict) else None
+						if _IsRaw(value):
+							values[position] = value
+							states[position] = ITEM_OK
+						else:
+							states[position] = ITEM_INVALID
+					elif e is not None:
+						states[position] = ITEM_ERROR
+					else:
+						states[position] = ITEM_MISSING
+
+			missing = {kind: [p for p, state in enumerate(states) if state != ITEM_OK] for kind, states in status.items()}
+			count = sum(len(m) for m in missing.values())
+			if not count or attempt == retries:
+				break
+			read_retries.Add(count, self.device.device)
+			time.sleep(backoff * 2 ** attempt)
+			requests = [(kind, request) for kind in ('SP', 'DP') for request in self._ListRequests(kind, missing[kind])]
+
+		# scale all values of each kind in one pass (values of missing items are left out below)
+		scaled = {kind: self.tables[kind].Scale(self.indices[kind], raw[kind]) for kind in raw}
+		return PartialRead(
+			{name: scaled[kind][position] for name, kind, position in self.targets if status[kind][position] == ITEM_OK},
+			{name: status[kind][position] for name, kind, position in self.targets},
+			error)
+
+	def Read(self, parallel=True):
+		"""Read values of all items
+
+		Parameters
+		----------
+		parallel : bool, optional
+			Run requests at the same time (see `ReadPartial`), by default True
+
+		Returns
+		-------
+		dict
+			Real values keyed by name (in order of prepared names)
+
+		Raises
+		------
+		Exception
+			Last request error (or RuntimeError) if some items couldn't be read
+		"""
+		r = self.ReadPartial(parallel)
+		if len(r.values) < len(r.status):
+			failed = [name for name, state in r.status.items() if state != ITEM_OK]
+			raise r.error or RuntimeError('%d of %d items not read (%s)' % (len(failed), len(r.status), ', '.join(failed)))
+		return r.values
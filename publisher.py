@@ -0,0 +1,81 @@
+"""
+MQTT publishing stage with change-only (deadband) filtering
+"""
+
+import time
+import threading
+
+class Publisher:
+	"""
+	Publishes values only if they changed (more than deadband) or if refresh interval expired.
+
+	Methods
+	-------
+	Publish(topic, value, deadband)
+		Publish value if needed
+
+	Reset()
+		Forget all sent values (everything is published on next call)
+	"""
+
+	def __init__(self, send, refresh=None, retain=False):
+		"""
+		Parameters
+		----------
+		send : callable
+			Function used to send message: send(topic, value, retain)
+		refresh : float, optional
+			Interval (in seconds) after which value is published even if it didn't change,
+			by default None (change-only filtering disabled, every value is published)
+		retain : bool, optional
+			Publish retained messages, by default False
+		"""
+		self.send = send
+		self.refresh = refresh
+		self.retain = retain
+		self.sent = 0
+		self.suppressed = 0
+		self._last = {}
+		self._lock = threading.Lock()
+
+	def Publish(self, topic, value, deadband=0):
+		"""Publish value if it changed by more than deadband (or refresh interval expired)
+
+		Parameters
+		----------
+		topic : str
+			Full MQTT topic
+		value : int, float
+			Value to publish
+		deadband : float, optional
+			Minimal change of value that is published, by default 0 (any change)
+
+		Returns
+		-------
+		bool
+			True if value was published
+		"""
+		if self.refresh is not None:
+			now = time.monotonic()
+			with self._lock:
+				last = self._last.get(topic)
+				if last is not None and now - last[1] < self.refresh and not self._Changed(last[0], value, deadband):
+					self.suppressed += 1
+					return False
+				self._last[topic] = (value, now)
+
+		self.send(topic, value, self.retain)
+		self.sent += 1
+		return True
+
+	def Reset(self):
+		"""Forget all sent values (e.g. after reconnect to broker)"""
+		with self._lock:
+			self._last.clear()
+
+	@staticmethod
+	def _Changed(old, new, deadband):
+		try:
+			return abs(new - old) > deadband
+		except TypeError:
+			return new != old
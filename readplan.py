@@ -0,0 +1,137 @@
+"""
+Planner for batched datapoint/setpoint reads
+
+Device offers two ways how to read multiple values:
+* list read (`datapointReadListValue`, `setpointReadListValue`) - one RPC with explicit [address, obj] pair per item
+* range read (`datapointReadValue`, `setpointReadValue`) - one RPC per run of neighbouring addresses
+
+Planner decides which addresses should be read as ranges and which should go to the list request,
+so that the total cost (see `CostModel`) of all requests is minimal.
+"""
+
+from collections import namedtuple
+
+# cost of read requests (in bytes of payload, RPC overhead expressed as bytes too)
+#   rpc        - fixed cost of every RPC (round trip, headers)
+#   list_base  - fixed payload of list request (JSON envelope)
+#   list_item  - payload of single [address, obj] pair in list request
+#   range_base - payload of range request parameters
+#   value      - payload of single value in response
+#   max_length - maximal number of values read by single range request
+#   max_list   - maximal number of items read by single list request (longer lists are split into chunks, None = unlimited)
+CostModel = namedtuple('CostModel', ['rpc', 'list_base', 'list_item', 'range_base', 'value', 'max_length', 'max_list'], defaults=[None])
+
+DEFAULT_COST = CostModel(rpc=300, list_base=40, list_item=28, range_base=30, value=16, max_length=32, max_list=None)
+
+# read plan
+#   ranges - list of (address, obj, length) tuples to be read by range requests
+#   items  - list of (address, obj) pairs to be read by list request(s) (see `ReadPlanner.Chunks`)
+#   cost   - estimated cost of the plan
+Plan = namedtuple('Plan', ['ranges', 'items', 'cost'])
+
+class ReadPlanner:
+	"""
+	Plans reads of given addresses according to cost model.
+
+	Methods
+	-------
+	Plan(addrs)
+		Create read plan for given addresses
+
+	Chunks(items)
+		Split list items to chunks readable by single request
+	"""
+
+	def __init__(self, cost=DEFAULT_COST):
+		"""
+		Parameters
+		----------
+		cost : CostModel, optional
+			Cost model used to compare list and range reads, by default `DEFAULT_COST`
+		"""
+		self.cost = cost
+
+	def Plan(self, addrs):
+		"""Create read plan for given addresses
+
+		Parameters
+		----------
+		addrs : list
+			List of (address, obj) pairs (duplicates are allowed)
+
+		Returns
+		-------
+		Plan
+			Plan covering all given addresses
+		"""
+		groups = {}
+		for address, obj in set(tuple(a) for a in addrs):
+			groups.setdefault(obj, []).append(address)
+
+		# plan where leftover items are read by list request
+		mixed = Plan([], [], 0)
+		# plan without list request (everything in ranges)
+		ranges = Plan([], [], 0)
+		for obj in sorted(groups):
+			addresses = sorted(groups[obj])
+			mixed = self._Merge(mixed, self._PlanGroup(obj, addresses, True))
+			ranges = self._Merge(ranges, self._PlanGroup(obj, addresses, False))
+
+		if mixed.items:
+			chunks = len(self.Chunks(mixed.items))
+			mixed = mixed._replace(cost=mixed.cost + chunks * (self.cost.rpc + self.cost.list_base))
+
+		if ranges.cost < mixed.cost:
+			return ranges
+		return mixed
+
+	def Chunks(self, items, parts=1):
+		"""Split list items to chunks of at most `max_list` items (one list request per chunk)
+
+		With `parts` > 1 items are also split evenly to (at least) `parts` chunks, e.g. one per session of pool
+		"""
+		n = self.cost.max_list or len(items) or 1
+		if parts > 1:
+			n = max(1, min(n, -(-len(items) // parts)))
+		return [items[i:i + n] for i in range(0, len(items), n)]
+
+	@staticmethod
+	def _Merge(a, b):
+		return Plan(a.ranges + b.ranges, a.items + b.items, a.cost + b.cost)
+
+	def _PlanGroup(self, obj, addresses, allow_list):
+		"""Find cheapest split of sorted addresses (of single object) to ranges and list items"""
+		c = self.cost
+		item_cost = c.list_item + c.value if allow_list else float('inf')
+		range_base = c.rpc + c.range_base
+
+		n = len(addresses)
+		# best[i] = (cost, start of last range or None for list item) for first i addresses
+		best = [(0, None)] + [None] * n
+		for i in range(1, n + 1):
+			best[i] = (best[i - 1][0] + item_cost, None)
+			j = i - 1
+			while j >= 0:
+				length = addresses[i - 1] - addresses[j] + 1
+				if length > c.max_length:
+					break
+				cost = best[j][0] + range_base + length * c.value
+				if cost < best[i][0]:
+					best[i] = (cost, j)
+				j -= 1
+
+		ranges = []
+		items = []
+		i = n
+		while i > 0:
+			j = best[i][1]
+			if j is None:
+				items.append((addresses[i - 1], obj))
+				i -= 1
+			else:
+				ranges.append((addresses[j], obj, addresses[i - 1] - addresses[j] + 1))
+				i = j
+
+		ranges.reverse()
+		items.reverse()
+		return Plan(ranges, items, best[n][0])
@@ -0,0 +1,180 @@
+"""
+Register map of Pichler unit (datapoints, setpoints, bitfields, malfunction codes)
+
+Definitions are loaded from `registers.json` and compiled into struct-of-arrays tables,
+so batch of raw values is scaled, sign-corrected and split into bits in a single pass.
+"""
+
+import os
+import json
+from array import array
+
+class Table:
+	"""
+	Compiled table of datapoints or setpoints (one array per attribute, item index is position in `names`)
+
+	Attributes
+	----------
+	names : list
+		Item names
+	index : dict
+		Item index keyed by name
+	address, obj : array
+		Read address of items
+	write_address, write_obj : array
+		Write address of items (-1 for read-only items)
+	scale : list
+		Scale of items (int or float, so integral values stay integers)
+	signed : array
+		1 for signed (int16) items, 0 for unsigned (uint16) ones
+	low, high : array
+		Limits of items (NaN if not defined)
+	bits : dict
+		List of (bit name, mask, label) keyed by item index (items that hold bitfields)
+
+	Methods
+	-------
+	Indices(names)
+		Get indices of items
+
+	Scale(indices, raw)
+		Scale raw values of items
+
+	Raw(index, value)
+		Convert real value of item to raw value
+
+	Bits(name, value)
+		Split value of item into named bits
+
+	Mask(name, bits)
+		Get mask of named bits
+	"""
+
+	def __init__(self, items, read_key=None):
+		nan = float('nan')
+		self.names = [i['name'] for i in items]
+		self.index = {name: n for n, name in enumerate(self.names)}
+		if read_key:
+			read = [i[read_key] for i in items]
+			write = [i.get('write') or (-1, -1) for i in items]
+		else:
+			read = [(i['address'], i['obj']) for i in items]
+			write = [(-1, -1)] * len(items)
+		self.address = array('H', [a for a, _ in read])
+		self.obj = array('B', [o for _, o in read])
+		self.write_address = array('l', [a for a, _ in write])
+		self.write_obj = array('l', [o for _, o in write])
+		self.scale = [i.get('scale', 1) for i in items]
+		self.signed = array('b', [1 if i.get('signed', True) else 0 for i in items])
+		limits = [i.get('limits') or (nan, nan) for i in items]
+		self.low = array('d', [l for l, _ in limits])
+		self.high = array('d', [h for _, h in limits])
+		self.bits = {n: [(b['name'], b['mask'], b.get('label', b['name'])) for b in i['bits']] for n, i in enumerate(items) if 'bits' in i}
+
+	def __len__(self):
+		return len(self.names)
+
+	def Indices(self, names):
+		"""Get indices of items (KeyError for unknown names)"""
+		index = self.index
+		return [index[name] for name in names]
+
+	def Scale(self, indices, raw):
+		"""Scale raw values of items
+
+		Parameters
+		----------
+		indices : list
+			Item indices
+		raw : list
+			Raw (int16) values of items (same order)
+
+		Returns
+		-------
+		list
+			Real values (unsigned items are corrected from int16 to uint16 first)
+		"""
+		scale, signed = self.scale, self.signed
+		return [(v if signed[i] else v & 0xFFFF) * scale[i] for i, v in zip(indices, raw)]
+
+	def Raw(self, index, value):
+		"""Convert real value of item to raw value (for writes)"""
+		return int(value / self.scale[index])
+
+	def Bits(self, name, value):
+		"""Split value of item into named bits
+
+		Parameters
+		----------
+		name : str
+			Item name
+		value : int
+			Value of item
+
+		Returns
+		-------
+		list
+			List of (bit name, 0/1, label)
+		"""
+		value = int(value)
+		return [(bit, 1 if value & mask else 0, label) for bit, mask, label in self.bits[self.index[name]]]
+
+	def Mask(self, name, bits):
+		"""Get mask of given named bits of item"""
+		masks = {bit: mask for bit, mask, _ in self.bits[self.index[name]]}
+		r = 0
+		for bit in bits:
+			r |= masks[bit]
+		return r
+
+class RegisterMap:
+	"""
+	All register definitions of the unit
+
+	Attributes
+	----------
+	datapoints : Table
+		Datapoint definitions
+	setpoints : Table
+		Setpoint definitions
+	malfunctions : dict
+		Description of malfunction codes keyed by code
+	"""
+
+	def __init__(self, definition):
+		"""
+		Parameters
+		----------
+		definition : dict
+			Parsed definition file (see `registers.json`)
+		"""
+		if definition.get('version') != 1:
+			raise ValueError('Unsupported register definition version %r' % definition.get('version'))
+		self.datapoints = Table(definition['datapoints'])
+		self.setpoints = Table(definition['setpoints'], 'read')
+		self.malfunctions = {int(k): v for k, v in definition.get('malfunctions', {}).items()}
+
+	def Malfunction(self, code):
+		"""Get description of malfunction code (None if unknown)"""
+		return self.malfunctions.get(int(code))
+
+def Load(path=None):
+	"""Load register definitions
+
+	Parameters
+	----------
+	path : str, optional
+		Definition file, by default `registers.json` next to this module
+
+	Returns
+	-------
+	RegisterMap
+		Compiled definitions
+	"""
+	if path is None:
+		path = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'registers.json')
+	with open(path, 'r') as file:
+		return RegisterMap(json.load(file))
+
+# register map of the unit
+REGISTERS = Load()
@@ -0,0 +1,303 @@
+"""
+Scan whole register map of Pichler unit and compare scans
+
+Usage:
+	python scan.py scan dump.bin [--kind DP,SP] [--obj 0-6] [--range 0-1023] [--workers 4]
+	python scan.py show dump.bin
+	python scan.py diff old.bin new.bin
+
+Address ranges are read by range requests (`datapointReadValue`, `setpointReadValue`) with adaptive chunk size:
+chunk grows after every complete response and it's split on error or truncated response,
+so unreadable addresses are isolated with few requests.
+"""
+
+import sys
+import time
+import struct
+import argparse
+import threading
+import concurrent.futures
+from array import array
+import pichler
+
+# dump file: header (magic, version, scan time), then one block per (kind, obj):
+#   block header (kind, obj, start address, count), validity bitmap (bit per address), count of int16 values
+MAGIC = b'PSCN'
+VERSION = 1
+HEADER = struct.Struct('<4sHd')
+BLOCK = struct.Struct('<2sBII')
+
+class Scanner:
+	"""
+	Reads address ranges of datapoints/setpoints with adaptive chunk size
+
+	Attributes
+	----------
+	requests : int
+		Number of RPCs sent
+	errors : int
+		Number of failed or truncated RPCs
+
+	Methods
+	-------
+	Scan(kind, obj, start, end)
+		Read all addresses in range
+	"""
+
+	def __init__(self, device, min_chunk=1, max_chunk=64, workers=4, segment=256, retries=2):
+		"""
+		Parameters
+		----------
+		device : pichler.Pichler
+			Device to scan
+		min_chunk : int, optional
+			Initial (and minimal) number of addresses read by single request, by default 1
+		max_chunk : int, optional
+			Maximal number of addresses read by single request, by default 64
+		workers : int, optional
+			Maximal number of concurrent requests, by default 4
+		segment : int, optional
+			Number of addresses scanned by single worker, by default 256
+		retries : int, optional
+			Number of retries of single address before it's considered unreadable, by default 2
+		"""
+		self.device = device
+		self.min_chunk = min_chunk
+		self.max_chunk = max_chunk
+		self.workers = workers
+		self.segment = segment
+		self.retries = retries
+		self.requests = 0
+		self.errors = 0
+		self._lock = threading.Lock()
+		# last good chunk size per (kind, obj), segments start with it
+		self._chunk = {}
+
+	def _Read(self, kind, address, obj, length):
+		read = self.device.DatapointRawReadValues if kind == 'DP' else self.device.SetpointRawReadValues
+		# single address is retried before it's considered unreadable
+		for _ in range(1 + (self.retries if length == 1 else 0)):
+			with self._lock:
+				self.requests += 1
+			try:
+				r = read(address, obj, length)
+				if r:
+					return r
+			except Exception:
+				pass
+		return None
+
+	def _ScanSegment(self, kind, obj, start, end, values):
+		chunk = self._chunk.get((kind, obj), self.min_chunk)
+		# pending ranges, split ranges are scanned before the rest
+		pending = [(start, end)]
+		while pending:
+			address, stop = pending.pop()
+			length = min(chunk, stop - address)
+			r = self._Read(kind, address, obj, length)
+			if r:
+				n = min(len(r), length)
+				values[address - start:address - start + n] = r[:n]
+				if n < length:
+					with self._lock:
+						self.errors += 1
+					chunk = max(self.min_chunk, n)
+				else:
+					chunk = min(self.max_chunk, chunk * 2)
+				self._chunk[(kind, obj)] = chunk
+				address += n
+				if address < stop:
+					pending.append((address, stop))
+				continue
+
+			with self._lock:
+				self.errors += 1
+			if length > 1:
+				# split failed chunk, its halves are retried with smaller chunks
+				half = length // 2
+				chunk = max(self.min_chunk, half)
+				if address + length < stop:
+					pending.append((address + length, stop))
+				pending.append((address + half, address + length))
+				pending.append((address, address + half))
+			elif address + 1 < stop:
+				# single unreadable address
+				pending.append((address + 1, stop))
+
+	def Scan(self, kind, obj, start, end):
+		"""Read all addresses in range
+
+		Parameters
+		----------
+		kind : str
+			'DP' for datapoints, 'SP' for setpoints
+		obj : int
+			Object to read from
+		start : int
+			First address
+		end : int
+			Address after the last one
+
+		Returns
+		-------
+		list
+			Raw values (None for addresses that couldn't be read)
+		"""
+		values = [None] * (end - start)
+		segments = [(s, min(s + self.segment, end)) for s in range(start, end, self.segment)]
+		parts = [[None] * (e - s) for s, e in segments]
+		with concurrent.futures.ThreadPoolExecutor(max_workers=self.workers) as executor:
+			futures = [executor.submit(self._ScanSegment, kind, obj, s, e, part) for (s, e), part in zip(segments, parts)]
+			for f in futures:
+				f.result()
+		for (s, e), part in zip(segments, parts):
+			values[s - start:e - start] = part
+		return values
+
+def Save(path, blocks, t=None):
+	"""Save scan to file
+
+	Parameters
+	----------
+	path : str
+		Output file
+	blocks : dict
+		Raw values (None for unreadable addresses) keyed by (kind, obj, start address)
+	t : float, optional
+		Time of scan, by default current time
+	"""
+	with open(path, 'wb') as file:
+		file.write(HEADER.pack(MAGIC, VERSION, t or time.time()))
+		for (kind, obj, start), values in sorted(blocks.items()):
+			file.write(BLOCK.pack(kind.encode(), obj, start, len(values)))
+			bitmap = bytearray((len(values) + 7) // 8)
+			for i, v in enumerate(values):
+				if v is not None:
+					bitmap[i >> 3] |= 1 << (i & 7)
+			file.write(bitmap)
+			data = array('h', [v if v is not None else 0 for v in values])
+			if sys.byteorder == 'big':
+				data.byteswap()
+			file.write(data.tobytes())
+
+def Load(path):
+	"""Load scan saved by `Save`
+
+	Returns
+	-------
+	tuple
+		(time, blocks) where blocks are raw values keyed by (kind, obj, start address)
+	"""
+	with open(path, 'rb') as file:
+		data = file.read()
+	magic, version, t = HEADER.unpack_from(data)
+	if magic != MAGIC or version != VERSION:
+		raise ValueError('%s is not a scan file' % path)
+	offset = HEADER.size
+	blocks = {}
+	while offset < len(data):
+		kind, obj, start, count = BLOCK.unpack_from(data, offset)
+		offset += BLOCK.size
+		bitmap = data[offset:offset + (count + 7) // 8]
+		offset += len(bitmap)
+		values = array('h')
+		values.frombytes(data[offset:offset + 2 * count])
+		if sys.byteorder == 'big':
+			values.byteswap()
+		offset += 2 * count
+		blocks[(kind.decode(), obj, start)] = [v if bitmap[i >> 3] & (1 << (i & 7)) else None for i, v in enumerate(values)]
+	return t, blocks
+
+def Registers(blocks):
+	"""Get raw values keyed by (kind, obj, address)"""
+	r = {}
+	for (kind, obj, start), values in blocks.items():
+		for i, v in enumerate(values):
+			r[(kind, obj, start + i)] = v
+	return r
+
+def KnownNames():
+	"""Get names of known datapoints/setpoints keyed by (kind, obj, address)"""
+	names = {}
+	for name, item in pichler.Pichler.DP.items():
+		names[('DP', item.addr[1], item.addr[0])] = name
+	for name, item in pichler.Pichler.SP.items():
+		names[('SP', item.addr_r[1], item.addr_r[0])] = name
+	return names
+
+def Diff(old, new):
+	"""Compare two scans
+
+	Parameters
+	----------
+	old, new : dict
+		Raw values keyed by (kind, obj, start address) (see `Load`)
+
+	Returns
+	-------
+	list
+		List of (kind, obj, address, old value, new value) of changed registers (None = not read/unreadable)
+	"""
+	a, b = Registers(old), Registers(new)
+	return [(k[0], k[1], k[2], a.get(k), b.get(k)) for k in sorted(set(a) | set(b)) if a.get(k) != b.get(k)]
+
+def ParseRange(text):
+	"""Parse '0-6' (inclusive) or '3' to range"""
+	first, _, last = text.partition('-')
+	return range(int(first), int(last or first) + 1)
+
+def main():
+	parser = argparse.ArgumentParser(description='Scan register map of Pichler unit')
+	commands = parser.add_subparsers(dest='command', required=True)
+
+	p = commands.add_parser('scan', help='scan registers to file')
+	p.add_argument('output', help='dump file')
+	p.add_argument('--kind', default='DP,SP', help='register kinds (DP,SP)')
+	p.add_argument('--obj', default='0-6', help='objects to scan, e.g. 0-6 (inclusive)')
+	p.add_argument('--range', default='0-1023', help='addresses to scan, e.g. 0-1023 (inclusive)')
+	p.add_argument('--workers', type=int, default=4, help='concurrent requests')
+	p.add_argument('--max-chunk', type=int, default=64, help='maximal addresses per request')
+
+	p = commands.add_parser('show', help='print registers stored in file')
+	p.add_argument('input', help='dump file')
+
+	p = commands.add_parser('diff', help='show registers that differ in two files')
+	p.add_argument('old', help='older dump file')
+	p.add_argument('new', help='newer dump file')
+
+	args = parser.parse_args()
+	names = KnownNames()
+
+	def Name(kind, obj, address):
+		return '%s %d/%d' % (kind, obj, address) + (' (%s)' % names[(kind, obj, address)] if (kind, obj, address) in names else '')
+
+	if args.command == 'scan':
+		scanner = Scanner(pichler.Pichler(), max_chunk=args.max_chunk, workers=args.workers)
+		addresses = ParseRange(args.range)
+		blocks = {}
+		start = time.monotonic()
+		for kind in args.kind.upper().split(','):
+			for obj in ParseRange(args.obj):
+				values = scanner.Scan(kind, obj, addresses.start, addresses.stop)
+				blocks[(kind, obj, addresses.start)] = values
+				print('%s obj %d: %d of %d addresses readable' % (kind, obj, sum(v is not None for v in values), len(values)))
+		Save(args.output, blocks)
+		print('%d requests (%d failed/truncated) in %.1f s' % (scanner.requests, scanner.errors, time.monotonic() - start))
+
+	elif args.command == 'show':
+		t, blocks = Load(args.input)
+		print('Scanned at %s' % time.ctime(t))
+		for (kind, obj, address), value in sorted(Registers(blocks).items()):
+			if value is not None:
+				print('%-40s %6d' % (Name(kind, obj, address), value))
+
+	elif args.command == 'diff':
+		t1, old = Load(args.old)
+		t2, new = Load(args.new)
+		print('%s -> %s' % (time.ctime(t1), time.ctime(t2)))
+		for kind, obj, address, a, b in Diff(old, new):
+			change = ' (%+d)' % (b - a) if a is not None and b is not None else ''
+			print('%-40s %6s -> %6s%s' % (Name(kind, obj, address), a, b, change))
+
+if __name__ == '__main__':
+	main()
@@ -0,0 +1,159 @@
+"""
+Per-item poll scheduler based on monotonic deadlines
+"""
+
+import time
+
+class PollScheduler:
+	"""
+	Keeps deadline of every polled item and tells which items are due.
+
+	Every item has its own poll interval and optional (shorter) fast interval
+	that is used while fast mode is active (see `SetFast`).
+	Deadlines are advanced by interval from the scheduled (not actual) time,
+	so the period doesn't drift by time needed to read data.
+
+	Methods
+	-------
+	Due(now)
+		Get items that should be read now
+
+	Done(names, now)
+		Mark items as read
+
+	Retry(names, delay)
+		Schedule items that couldn't be read to be read again soon
+
+	NextDeadline()
+		Get time when next item is due
+
+	SetFast(active)
+		Switch between normal and fast intervals
+	"""
+
+	def __init__(self, intervals, fast_intervals=None, window=1.0):
+		"""
+		Parameters
+		----------
+		intervals : dict
+			Poll interval (in seconds) keyed by item name
+		fast_intervals : dict, optional
+			Poll interval used in fast mode keyed by item name (missing items use normal interval), by default None
+		window : float, optional
+			Items due within this time (in seconds) are read together with items that are due already, by default 1.0
+		"""
+		self.intervals = dict(intervals)
+		self.fast_intervals = dict(fast_intervals or {})
+		self.window = window
+		self.fast = False
+
+		# statistics
+		self.ticks = 0
+		self.overruns = 0
+		self.jitter_max = 0.0
+		self.jitter_sum = 0.0
+		self.jitter_count = 0
+
+		now = time.monotonic()
+		self._deadlines = dict.fromkeys(self.intervals, now)
+		self._last = {}
+
+	def Interval(self, name):
+		"""Get current poll interval of item"""
+		if self.fast:
+			return self.fast_intervals.get(name, self.intervals[name])
+		return self.intervals[name]
+
+	def Due(self, now=None):
+		"""Get items that should be read now
+
+		Parameters
+		----------
+		now : float, optional
+			Current monotonic time, by default `time.monotonic()`
+
+		Returns
+		-------
+		list
+			Names of items that are due (in order of definition)
+		"""
+		if now is None:
+			now = time.monotonic()
+		limit = now + self.window
+		return [name for name, deadline in self._deadlines.items() if deadline <= limit]
+
+	def Done(self, names, now=None):
+		"""Mark items as read and schedule their next read
+
+		Parameters
+		----------
+		names : list
+			Names of items that were read (result of `Due`)
+		now : float, optional
+			Monotonic time when items were due (i.e. when `Due` was called), by default `time.monotonic()`
+
+		Returns
+		-------
+		int
+			Number of items that missed their next deadline (overruns)
+		"""
+		if now is None:
+			now = time.monotonic()
+		finished = time.monotonic()
+		overruns = 0
+		for name in names:
+			scheduled = self._deadlines[name]
+			jitter = abs(now - scheduled)
+			self.jitter_max = max(self.jitter_max, jitter)
+			self.jitter_sum += jitter
+			self.jitter_count += 1
+
+			deadline = scheduled + self.Interval(name)
+			if deadline <= finished:
+				# skip missed deadline(s)
+				overruns += 1
+				deadline = finished + self.Interval(name)
+			self._deadlines[name] = deadline
+			self._last[name] = now
+
+		self.ticks += 1
+		self.overruns += overruns
+		return overruns
+
+	def Retry(self, names, delay):
+		"""Schedule items that couldn't be read to be read again (they are not marked as read)
+
+		Parameters
+		----------
+		names : list
+			Names of items that weren't read
+		delay : float
+			Time (in seconds) after which items are due again (their poll interval if it's shorter)
+		"""
+		now = time.monotonic()
+		for name in names:
+			self._deadlines[name] = now + min(delay, self.Interval(name))
+
+	def NextDeadline(self):
+		"""Get monotonic time when next item is due"""
+		return min(self._deadlines.values())
+
+	def SetFast(self, active):
+		"""Switch between normal and fast poll intervals
+
+		Deadlines of all items are recomputed from time of their last read, so switch takes effect immediately.
+
+		Parameters
+		----------
+		active : bool
+			Use fast intervals
+		"""
+		if active == self.fast:
+			return
+		self.fast = active
+		for name, last in self._last.items():
+			self._deadlines[name] = last + self.Interval(name)
+
+	def JitterMean(self):
+		"""Get mean difference between scheduled and actual time of reads"""
+		return self.jitter_sum / self.jitter_count if self.jitter_count else 0.0
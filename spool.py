@@ -0,0 +1,260 @@
+"""
+Bounded on-disk spool of MQTT messages (store-and-forward while broker is unreachable)
+"""
+
+import os
+import time
+import json
+import base64
+import threading
+
+class Spool:
+	"""
+	Append-only spool of messages stored in segment files.
+
+	Every message is one JSON line: [time, topic, payload, retain, binary].
+	Replay position is stored in separate file, so messages survive restart
+	(message can be replayed twice if process crashes during replay, never lost).
+	When spool exceeds its size limit, the oldest segment is dropped.
+
+	Attributes
+	----------
+	depth : int
+		Number of messages waiting for replay
+	dropped : int
+		Number of messages dropped (spool full or damaged record)
+	replayed : int
+		Number of replayed messages
+
+	Methods
+	-------
+	Append(topic, payload, retain)
+		Store message
+
+	Sync()
+		Flush stored messages to disk
+
+	Replay(publish, connected, rate)
+		Replay stored messages forever (run in background thread)
+	"""
+
+	def __init__(self, path, max_bytes=64 * 1024 * 1024, segment_bytes=1024 * 1024):
+		"""
+		Parameters
+		----------
+		path : str
+			Spool directory
+		max_bytes : int, optional
+			Maximal size of spool, by default 64 MiB
+		segment_bytes : int, optional
+			Size of single segment file, by default 1 MiB
+		"""
+		self.path = path
+		self.max_bytes = max_bytes
+		self.segment_bytes = segment_bytes
+		self.depth = 0
+		self.dropped = 0
+		self.replayed = 0
+		self._lock = threading.Lock()
+		self._file = None
+
+		os.makedirs(path, exist_ok=True)
+		self._position = (0, 0)
+		try:
+			with open(os.path.join(path, 'position.json'), 'r') as file:
+				self._position = tuple(json.load(file))
+		except (OSError, ValueError):
+			pass
+
+		# drop segments that were already replayed, count pending messages
+		for segment in self._Segments():
+			if segment < self._position[0]:
+				os.remove(self._Path(segment))
+		for segment in self._Segments():
+			self.depth += self._Count(segment, self._position[1] if segment == self._position[0] else 0)
+
+	def _Segments(self):
+		return sorted(int(name[:-6]) for name in os.listdir(self.path) if name.endswith('.spool'))
+
+	def _Path(self, segment):
+		return os.path.join(self.path, '%016d.spool' % segment)
+
+	def _Count(self, segment, offset=0, end=None):
+		"""Count complete records of segment between offsets (to the end of segment by default)"""
+		with open(self._Path(segment), 'rb') as file:
+			file.seek(offset)
+			if end is not None:
+				return file.read(end - offset).count(b'\n')
+			return sum(1 for line in file if line.endswith(b'\n'))
+
+	def Append(self, topic, payload, retain=False, t=None):
+		"""Store message
+
+		Parameters
+		----------
+		topic : str
+			MQTT topic
+		payload : int, float, str, bytes
+			Message payload
+		retain : bool, optional
+			Retain flag, by default False
+		t : float, optional
+			Time of message, by default current time
+		"""
+		binary = isinstance(payload, (bytes, bytearray))
+		if binary:
+			payload = base64.b64encode(payload).decode()
+		line = (json.dumps([t or time.time(), topic, payload, retain, binary]) + '\n').encode()
+
+		with self._lock:
+			if self._file is None or self._file.tell() >= self.segment_bytes:
+				self._Rotate()
+			self._file.write(line)
+			self.depth += 1
+
+	def _Rotate(self):
+		if self._file is not None:
+			self._file.close()
+		segments = self._Segments()
+		segment = segments[-1] + 1 if segments else self._position[0]
+		self._file = open(self._Path(segment), 'ab')
+
+		# enforce size limit by dropping the oldest segments
+		segments.append(segment)
+		while len(segments) > 1 and sum(os.path.getsize(self._Path(s)) for s in segments) > self.max_bytes:
+			oldest = segments.pop(0)
+			count = self._Count(oldest, self._position[1] if oldest == self._position[0] else 0)
+			os.remove(self._Path(oldest))
+			self.depth -= count
+			self.dropped += count
+			if self._position < (segments[0], 0):
+				self._SavePosition((segments[0], 0))
+
+	def Sync(self):
+		"""Flush stored messages to disk"""
+		with self._lock:
+			if self._file is not None:
+				self._file.flush()
+				os.fsync(self._file.fileno())
+
+	def _SavePosition(self, position):
+		self._position = position
+		temp = os.path.join(self.path, 'position.tmp')
+		with open(temp, 'w') as file:
+			json.dump(list(position), file)
+		os.replace(temp, os.path.join(self.path, 'position.json'))
+
+	def Read(self, count):
+		"""Read oldest messages (they stay in spool until `Commit`)
+
+		Parameters
+		----------
+		count : int
+			Maximal number of messages
+
+		Returns
+		-------
+		list
+			List of (time, topic, payload, retain, position) tuples, position of the last published message
+			should be passed to `Commit` (damaged records are returned with topic None)
+		"""
+		with self._lock:
+			if self._file is not None:
+				self._file.flush()
+			segment, offset = self._position
+			messages = []
+			for s in self._Segments():
+				if s < segment:
+					continue
+				if s > segment:
+					segment, offset = s, 0
+				with open(self._Path(segment), 'rb') as file:
+					file.seek(offset)
+					for line in file:
+						if not line.endswith(b'\n'):
+							# incomplete record (being written or damaged by crash)
+							break
+						offset += len(line)
+						try:
+							t, topic, payload, retain, binary = json.loads(line)
+							if binary:
+								payload = base64.b64decode(payload)
+						except ValueError:
+							t, topic, payload, retain = None, None, None, None
+						messages.append((t, topic, payload, retain, (segment, offset)))
+						if len(messages) >= count:
+							return messages
+			return messages
+
+	def Commit(self, position, damaged=()):
+		"""Mark messages returned by `Read` as published
+
+		Messages dropped meanwhile (spool was full while they were being published) are already counted
+		as dropped, so only the records between current replay position and given position are counted.
+
+		Parameters
+		----------
+		position : tuple
+			Position of the last published message returned by `Read`
+		damaged : list, optional
+			Positions of damaged records (topic None) among processed messages, counted as dropped
+		"""
+		with self._lock:
+			start = self._position
+			if position <= start:
+				# messages were dropped meanwhile (spool was full)
+				return
+			count = 0
+			for segment in self._Segments():
+				if segment > position[0]:
+					break
+				if segment >= start[0]:
+					count += self._Count(segment, start[1] if segment == start[0] else 0, position[1] if segment == position[0] else None)
+				if segment < position[0]:
+					os.remove(self._Path(segment))
+			damaged = sum(1 for p in damaged if p > start)
+			self._SavePosition(position)
+			self.depth -= count
+			self.dropped += damaged
+			self.replayed += count - damaged
+
+	def Replay(self, publish, connected, rate=50, log=print):
+		"""Replay stored messages in order they were stored (runs forever)
+
+		Parameters
+		----------
+		publish : callable
+			Function used to publish message: publish(topic, payload, retain) -> bool (True on success)
+		connected : callable
+			Function that returns True while broker is connected
+		rate : float, optional
+			Maximal number of replayed messages per second, by default 50
+		log : callable, optional
+			Logging function, by default print
+		"""
+		while True:
+			if not self.depth or not connected():
+				time.sleep(1)
+				continue
+
+			start = time.monotonic()
+			messages = self.Read(max(1, int(rate)))
+			if not messages:
+				time.sleep(1)
+				continue
+			damaged = []
+			position = None
+			for t, topic, payload, retain, position_after in messages:
+				if topic is None:
+					damaged.append(position_after)
+				elif not publish(topic, payload, retain):
+					# broker disconnected, the rest stays in spool
+					break
+				position = position_after
+
+			if position is not None:
+				self.Commit(position, damaged)
+				if not self.depth:
+					log('Spool replayed (%d messages replayed, %d dropped)' % (self.replayed, self.dropped))
+
+			time.sleep(max(0, start + len(messages) / rate - time.monotonic()))
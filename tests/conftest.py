@@ -0,0 +1,5 @@
+import os
+import sys
+
+# modules of the package are in repository root
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
@@ -0,0 +1,34 @@
+import history
+
+T0 = 1700000030.0
+
+def Store(retention=history.DEFAULT_RETENTION):
+	store = history.HistoryStore(['co2'], retention=retention)
+	for i in range(600):
+		store.Append(T0 + i, {'co2': 400 + i})
+	return store
+
+def Buckets(start, end, bucket):
+	"""Expected (time, min, max, mean) of rollup buckets of samples in [start, end)"""
+	r = {}
+	for i in range(600):
+		t = T0 + i
+		if start - start % bucket <= t < end:
+			r.setdefault(t - t % bucket, []).append(400 + i)
+	return [(t, min(v), max(v), sum(v) / len(v)) for t, v in sorted(r.items())]
+
+def test_query_before_first_sample():
+	store = Store()
+	# range starts before the first sample, raw samples still satisfy requested resolution
+	r = store.Query('co2', T0 - 5, T0 + 600, resolution=1)
+	assert len(r) == 600
+	assert r[0] == (T0, 400, 400, 400)
+
+	assert store.Query('co2', T0 - 5, T0 + 600, resolution=60) == Buckets(T0 - 5, T0 + 600, 60)
+	assert store.Query('co2', T0 - 5, T0 + 600, resolution=900) == Buckets(T0 - 5, T0 + 600, 900)
+
+def test_query_range_older_than_raw_samples():
+	# raw ring holds only last 100 samples, older part of range is served from rollup
+	store = Store(retention=100)
+	assert store.Query('co2', T0 + 90, T0 + 600, resolution=1) == Buckets(T0 + 90, T0 + 600, 60)
+	assert len(store.Query('co2', T0 + 550, T0 + 600, resolution=1)) == 50
@@ -0,0 +1,65 @@
+import time
+
+import pytest
+
+import nabto
+import nabtoapi
+import fakenabto
+from nabtoapi import NabtoError
+
+URL = b'nabto://abc.remote.lscontrol.dk/ping.json?ping=1886350951'
+
+@pytest.fixture
+def session(tmp_path, monkeypatch):
+	monkeypatch.setattr(nabto, 'REOPEN_BACKOFF', 0.2)
+	# no jitter, reopen is retried after full backoff delay
+	monkeypatch.setattr(nabto.random, 'uniform', lambda a, b: b)
+	lib = fakenabto.FakeLibrary()
+	client = nabto.Client(str(tmp_path), lib)
+	return lib, client.OpenSession('user', 'password', 'test')
+
+def test_outage_reopen_backoff_recovery(session):
+	lib, s = session
+	assert s.RpcInvoke(URL)
+
+	start = time.monotonic()
+	lib.Outage(1.0)
+	# session is dropped, immediate reopen fails too
+	with pytest.raises(NabtoError) as e:
+		s.RpcInvoke(URL)
+	assert e.value.status == nabtoapi.NABTO_NO_NETWORK
+	assert not s.healthy
+	assert s._retry_at - time.monotonic() == pytest.approx(0.2, abs=0.05)
+
+	# RPCs fail right away until backoff expires
+	with pytest.raises(NabtoError, match='next reopen'):
+		s.RpcInvoke(URL)
+
+	# every failed reopen doubles the delay
+	delays = []
+	while True:
+		time.sleep(max(0, s._retry_at - time.monotonic()))
+		try:
+			r = s.RpcInvoke(URL)
+			break
+		except NabtoError:
+			delays.append(s._retry_at - time.monotonic())
+	assert delays and delays[0] == pytest.approx(0.4, abs=0.05)
+	assert all(b > a for a, b in zip(delays, delays[1:]))
+
+	assert r and s.healthy
+	assert s.reopens == 1
+	assert 1.0 <= s.recovery_time <= time.monotonic() - start
+	assert s._attempts == 0
+
+def test_empty_responses(session, monkeypatch):
+	lib, s = session
+	invoke = lib.RpcInvoke
+	monkeypatch.setattr(lib, 'RpcInvoke', lambda session, url: None)
+	for _ in range(nabto.EMPTY_LIMIT):
+		assert s.RpcInvoke(URL) == []
+	assert not s.healthy
+
+	monkeypatch.setattr(lib, 'RpcInvoke', invoke)
+	assert s.RpcInvoke(URL)
+	assert s.healthy and s.reopens == 1
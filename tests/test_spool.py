@@ -0,0 +1,62 @@
+import os
+
+import pytest
+
+import spool
+
+def Fill(s, start, count):
+	for i in range(start, start + count):
+		s.Append('topic/%d' % i, i, t=1.0)
+
+def Pending(s):
+	"""Topics of all messages still in spool (from replay position)"""
+	return [topic for t, topic, payload, retain, position in s.Read(1000)]
+
+def test_rotate_during_replay(tmp_path):
+	# ~5 records per segment, at most 3 segments
+	s = spool.Spool(str(tmp_path), max_bytes=600, segment_bytes=200)
+	Fill(s, 0, 8)
+	batch = s.Read(8)
+	# batch starts in first segment and continues into second one
+	assert batch[0][4][0] != batch[-1][4][0]
+
+	# spool gets full while the batch is being published, first segment is dropped
+	i = 8
+	while not s.dropped:
+		Fill(s, i, 1)
+		i += 1
+	dropped = s.dropped
+	assert 0 < dropped < 8
+
+	s.Commit(batch[-1][4])
+	assert s.depth == len(Pending(s)) == i - 8
+	assert s.replayed == 8 - dropped
+	assert s.dropped == dropped
+
+def test_damaged_record(tmp_path):
+	s = spool.Spool(str(tmp_path))
+	Fill(s, 0, 1)
+	s.Sync()
+	segment = [name for name in os.listdir(str(tmp_path)) if name.endswith('.spool')][0]
+	with open(os.path.join(str(tmp_path), segment), 'ab') as file:
+		file.write(b'not json\n')
+	# spool reopened after crash (damaged record is counted as pending)
+	s = spool.Spool(str(tmp_path))
+	Fill(s, 1, 1)
+	assert s.depth == 3
+
+	class Replayed(Exception):
+		pass
+
+	def Log(message):
+		raise Replayed(message)
+
+	published = []
+	with pytest.raises(Replayed):
+		s.Replay(lambda topic, payload, retain: published.append(topic) or True, lambda: True, rate=1000, log=Log)
+	assert published == ['topic/0', 'topic/1']
+	assert (s.depth, s.replayed, s.dropped) == (0, 2, 1)
+
+	# replay position survives restart
+	s = spool.Spool(str(tmp_path))
+	assert s.depth == 0 and Pending(s) == []
@@ -0,0 +1,135 @@
+"""
+Dedicated thread for device I/O (one call at a time, writes before reads)
+"""
+
+import time
+import queue
+import itertools
+import threading
+import contextlib
+import concurrent.futures
+import metrics
+
+# call priorities (lower runs first)
+WRITE = 0
+READ = 1
+
+PRIORITY_NAMES = {WRITE: 'write', READ: 'read'}
+
+_local = threading.local()
+
+@contextlib.contextmanager
+def Priority(priority):
+	"""Context in which device calls of current thread run with given priority
+	(e.g. read back of written values should not wait behind pending reads)"""
+	previous = getattr(_local, 'priority', None)
+	_local.priority = priority
+	try:
+		yield
+	finally:
+		_local.priority = previous
+
+def CurrentPriority(default=READ):
+	"""Get priority set by `Priority` context (or default if not set)"""
+	priority = getattr(_local, 'priority', None)
+	return default if priority is None else priority
+
+queue_wait = metrics.REGISTRY.Histogram('pichler_worker_wait_seconds', 'Time device calls waited in worker queue', ['worker', 'priority'])
+
+class DeviceWorker:
+	"""
+	Runs device calls one by one on dedicated thread.
+
+	Calls are queued by priority (writes jump ahead of pending reads), calls of the same priority
+	run in order they were submitted. Callers get future of the call.
+
+	Attributes
+	----------
+	calls : int
+		Number of executed calls
+	wait_max : float
+		Longest time a call waited in queue (seconds)
+
+	Methods
+	-------
+	Submit(priority, func, *args)
+		Queue call, returns future
+
+	Call(priority, func, *args)
+		Queue call and wait for its result
+
+	Close()
+		Stop worker after queued calls are done
+	"""
+
+	def __init__(self, name='device'):
+		"""
+		Parameters
+		----------
+		name : str, optional
+			Worker name (thread name, metrics label), by default 'device'
+		"""
+		self.name = name
+		self.calls = 0
+		self.wait_max = 0.0
+		self._queue = queue.PriorityQueue()
+		self._sequence = itertools.count()
+		self._thread = threading.Thread(target=self._Run, name=name, daemon=True)
+		self._thread.start()
+
+	@property
+	def depth(self):
+		"""Number of queued calls"""
+		return self._queue.qsize()
+
+	def IsCurrent(self):
+		"""Check whether caller runs on worker thread"""
+		return threading.current_thread() is self._thread
+
+	def Submit(self, priority, func, *args):
+		"""Queue call
+
+		Parameters
+		----------
+		priority : int
+			`WRITE` or `READ`
+		func : callable
+			Function to call
+		*args
+			Arguments of function
+
+		Returns
+		-------
+		concurrent.futures.Future
+			Future of call result
+		"""
+		future = concurrent.futures.Future()
+		self._queue.put((priority, next(self._sequence), time.monotonic(), future, func, args))
+		return future
+
+	def Call(self, priority, func, *args):
+		"""Queue call and wait for its result (call runs directly if caller is worker itself)"""
+		if self.IsCurrent():
+			return func(*args)
+		return self.Submit(priority, func, *args).result()
+
+	def Close(self):
+		"""Stop worker after queued calls are done"""
+		self._queue.put((READ + 1, next(self._sequence), time.monotonic(), None, None, None))
+		self._thread.join()
+
+	def _Run(self):
+		while True:
+			priority, _, queued, future, func, args = self._queue.get()
+			if future is None:
+				break
+			if not future.set_running_or_notify_cancel():
+				continue
+			wait = time.monotonic() - queued
+			self.wait_max = max(self.wait_max, wait)
+			queue_wait.Observe(wait, self.name, PRIORITY_NAMES.get(priority, str(priority)))
+			self.calls += 1
+			try:
+				future.set_result(func(*args))
+			except BaseException as e:
+				future.set_exception(e)
@@ -0,0 +1,110 @@
+"""
+Coalescing queue for setpoint writes
+"""
+
+import threading
+import traceback
+import concurrent.futures
+import worker
+
+class WriteQueue:
+	"""
+	Collects setpoint writes over short window and sends them in one request.
+
+	Only the last value of every setpoint is written. After write, all written setpoints
+	are read back in one request and confirmed values are passed to `on_confirm` callback.
+
+	Methods
+	-------
+	Put(sp, value)
+		Queue setpoint write, returns future of confirmed value
+
+	Flush()
+		Write queued values now
+	"""
+
+	def __init__(self, device, window=0.5, on_confirm=None, log=print):
+		"""
+		Parameters
+		----------
+		device : pichler.Pichler
+			Device to write to
+		window : float, optional
+			Time (in seconds) to collect writes before they are sent, by default 0.5
+		on_confirm : callable, optional
+			Called with dict of read back setpoint values (keyed by setpoint name) after every write, by default None
+		log : callable, optional
+			Logging function, by default print
+		"""
+		self.device = device
+		self.window = window
+		self.on_confirm = on_confirm
+		self.log = log
+		self.queued = 0
+		self.written = 0
+		self._pending = {}
+		self._futures = {}
+		self._timer = None
+		self._lock = threading.Lock()
+
+	def Put(self, sp, value):
+		"""Queue setpoint write (replaces value queued earlier for the same setpoint)
+
+		Parameters
+		----------
+		sp : str
+			Setpoint name (see `pichler.Pichler.SP` dict)
+		value : int, float
+			Value to set
+
+		Returns
+		-------
+		concurrent.futures.Future
+			Future of value read back after write
+		"""
+		future = concurrent.futures.Future()
+		with self._lock:
+			self._pending.pop(sp, None)
+			self._pending[sp] = value
+			self._futures.setdefault(sp, []).append(future)
+			self.queued += 1
+			if self._timer is None:
+				self._timer = threading.Timer(self.window, self.Flush)
+				self._timer.daemon = True
+				self._timer.start()
+		return future
+
+	def Flush(self):
+		"""Write queued values now and read them back"""
+		with self._lock:
+			if self._timer is not None:
+				self._timer.cancel()
+				self._timer = None
+			pending, self._pending = self._pending, {}
+			futures, self._futures = self._futures, {}
+
+		if not pending:
+			return
+
+		try:
+			# write and read back ahead of pending reads (if device runs RPCs on worker)
+			with worker.Priority(worker.WRITE):
+				self.device.SetSetpoints(list(pending.items()))
+				self.written += len(pending)
+
+				names = list(pending)
+				confirmed = dict(zip(names, self.device.GetSetpoints(names)))
+			for sp, value in pending.items():
+				if abs(confirmed[sp] - value) >= self.device.SP[sp].scale:
+					self.log('Setpoint %s: written %s, read back %s' % (sp, value, confirmed[sp]))
+				for future in futures.get(sp, ()):
+					future.set_result(confirmed[sp])
+			if self.on_confirm:
+				self.on_confirm(confirmed)
+		except Exception as e:
+			self.log('Error in SetSetpoints: ' + str(e))
+			traceback.print_exc()
+			for sp in futures:
+				for future in futures[sp]:
+					if not future.done():
+						future.set_exception(e)